@@ -4,16 +4,25 @@ TG-Trade Suite FastAPI Application
 import os
 import sys
 import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.staticfiles import StaticFiles
 
 # Add the parent directory to Python path
 sys.path.append('/app')
 
+logger = logging.getLogger(__name__)
+
+# Reused verbatim so asyncpg serves it from the per-connection statement cache
+USERS_COUNT_QUERY = "SELECT COUNT(*) FROM users"
+
 app = FastAPI(
     title="TG-Trade Suite API", 
     version="1.0.0",
-    description="AI-powered chart analysis for Telegram"
+    description="AI-powered chart analysis for Telegram",
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -25,6 +34,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Serve uploaded charts so OpenAI can fetch them by URL (opt-in; file names
+# are random and files are removed after IMAGE_RETENTION_SECONDS)
+if os.getenv('IMAGE_PUBLIC_BASE_URL'):
+    upload_folder = os.getenv('UPLOAD_FOLDER', '/app/uploads')
+    os.makedirs(upload_folder, exist_ok=True)
+    app.mount("/uploads", StaticFiles(directory=upload_folder), name="uploads")
+
 @app.get("/")
 async def root():
     return {
@@ -41,33 +57,53 @@ async def health():
         "environment": os.getenv("DEBUG", "False")
     }
 
-@app.get("/test-db-real")
-async def test_database_connection():
-    """Test real database connection"""
+@app.on_event("startup")
+async def startup():
+    """Open the shared Postgres connection pool"""
+    app.state.pg_pool = None
+    app.state.pg_error = "No DATABASE_URL found"
     try:
         # Import asyncpg inside the function to avoid startup crashes
         import asyncpg
-        
+
         database_url = os.getenv('DATABASE_URL', '')
-        if not database_url:
-            return {"status": "error", "message": "No DATABASE_URL found"}
-        
-        # Test connection
-        conn = await asyncpg.connect(database_url)
-        
+        if database_url:
+            app.state.pg_pool = await asyncpg.create_pool(
+                database_url,
+                min_size=10,
+                max_size=50,
+                max_inactive_connection_lifetime=300,
+                command_timeout=60,
+                statement_cache_size=1024,
+            )
+    except ImportError:
+        app.state.pg_error = "asyncpg not installed"
+    except Exception as e:
+        app.state.pg_error = f"Database connection failed: {str(e)}"
+        logger.error("Database pool not available: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the shared Postgres connection pool"""
+    if app.state.pg_pool is not None:
+        await app.state.pg_pool.close()
+
+@app.get("/test-db-real")
+async def test_database_connection():
+    """Test real database connection"""
+    try:
+        pool = app.state.pg_pool
+        if pool is None:
+            return {"status": "error", "message": app.state.pg_error}
+
         # Test query
-        result = await conn.fetchrow("SELECT COUNT(*) as count FROM users")
-        await conn.close()
-        
+        async with pool.acquire() as conn:
+            count = await conn.fetchval(USERS_COUNT_QUERY)
+
         return {
             "status": "success", 
             "message": "Database connected successfully",
-            "users_count": result['count'] if result else 0
-        }
-    except ImportError:
-        return {
-            "status": "error", 
-            "message": "asyncpg not installed"
+            "users_count": count or 0
         }
     except Exception as e:
         return {
@@ -78,13 +114,14 @@ async def test_database_connection():
 @app.get("/test-env")
 async def test_environment():
     """Test environment variables"""
+    database_url = os.getenv('DATABASE_URL', '')
     return {
-        "database_url_exists": bool(os.getenv('DATABASE_URL')),
-        "database_url_preview": os.getenv('DATABASE_URL', '')[:30] + "..." if os.getenv('DATABASE_URL') else "None",
+        "database_url_exists": bool(database_url),
+        "database_url_preview": database_url[:30] + "..." if database_url else "None",
         "debug": os.getenv('DEBUG', 'False'),
         "redis_url": os.getenv('REDIS_URL', 'Not set')
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -10,6 +10,10 @@ import asyncio
 import logging
 import os
 import signal
+import sys
+from urllib.parse import urlparse
+
+import uvloop
 
 
 
@@ -25,6 +29,17 @@ from telegram.ext import (
 # (optional) if you prefer everything at top level:
 # from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
 
+# Analysis helpers are imported once here, not on every incoming image
+sys.path.append("/app")
+from config import env_flag
+try:
+    from utils.image_handler import image_handler
+    from utils.ai_analyzer import ai_analyzer
+except ImportError as _import_error:
+    logging.getLogger(__name__).error("❌ Analysis modules unavailable: %s", _import_error)
+    image_handler = None
+    ai_analyzer = None
+
 
 logging.getLogger("telegram.ext").setLevel(logging.DEBUG)   # ▶ ADD THIS
 
@@ -37,10 +52,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Max concurrent OpenAI Vision calls; further images queue on the semaphore
+_AI_SEM = asyncio.Semaphore(int(os.getenv("AI_CONCURRENCY", "8")))
+
+# Command replies – built once; /start only fills in the user fields
+_START_TEMPLATE = (
+    "🎯 **Welcome to SoliTrader Chart Analyzer, {first_name}!**\n\n"
+    "I'm your AI-powered technical analysis assistant.\n\n"
+    "**Your Info:**\n"
+    "• ID: {user_id}\n"
+    "• Username: @{username}\n\n"
+    "**How to use:**\n"
+    "1️⃣ Send me any trading chart image\n"
+    "2️⃣ I'll analyze it with AI\n"
+    "3️⃣ Get detailed technical analysis\n\n"
+    "**Commands:**\n"
+    "• /start - This message\n"
+    "• /analyze - Instructions for analysis\n"
+    "• /help - Get help\n\n"
+    "📊 Just send me a chart image to start!"
+)
+
+_ANALYZE_MESSAGE = (
+    "📊 **How to Analyze Charts**\n\n"
+    "Simply send me a chart image and I'll analyze it!\n\n"
+    "**Supported formats:** PNG, JPG, JPEG\n"
+    "**Max size:** 5MB\n\n"
+    "**What I analyze:**\n"
+    "• 📈 Trend direction\n"
+    "• 🎯 Support/Resistance levels\n"
+    "• 📐 Chart patterns\n"
+    "• 📊 Volume (if visible)\n"
+    "• 🎪 Price targets\n"
+    "• ⚠️ Risk assessment\n\n"
+    "Send me a chart image now!"
+)
+
+_HELP_MESSAGE = (
+    "📚 **SoliTrader AI Assistant Help**\n\n"
+    "**Available Commands:**\n"
+    "• /start - Welcome message\n"
+    "• /analyze - How to analyze charts\n"
+    "• /help - Show this help\n\n"
+    "**To analyze a chart:**\n"
+    "Just send me any trading chart image!\n\n"
+    "**Supported formats:** PNG, JPG, JPEG (max 5MB)\n\n"
+    "⚠️ *Analysis is for educational purposes only*"
+)
+
 class TelegramBot:
     def __init__(self):
         self.app = None
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
+        # Webhook mode is opt-in; otherwise the bot long-polls as before
+        # (parsed like Config.TELEGRAM_USE_WEBHOOK, so both agree)
+        use_webhook = env_flag('TELEGRAM_USE_WEBHOOK')
+        self.webhook_url = os.getenv('TELEGRAM_WEBHOOK_URL') if use_webhook else None
+        self._stop = asyncio.Event()
         
     async def setup(self):
         """Setup the bot"""
@@ -50,7 +118,7 @@ class TelegramBot:
             logger.error("❌ No token found!")
             return False
             
-        logger.info(f"🔑 Token: {self.token[:20]}...")
+        logger.debug("🔑 Token: %s...", self.token[:20])
         
         try:
 
@@ -58,63 +126,35 @@ class TelegramBot:
             logger.info("✅ Telegram imports successful")
             
             # Build application
-            self.app = ApplicationBuilder().token(self.token).build()
+            self.app = (
+                ApplicationBuilder()
+                .token(self.token)
+                .http_version("2")
+                .connection_pool_size(256)
+                .pool_timeout(30)
+                .get_updates_connection_pool_size(32)
+                .build()
+            )
             logger.info("✅ Application built")
             
             # Define commands
             async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 user = update.effective_user
-                message = (
-                    f"🎯 **Welcome to SoliTrader Chart Analyzer, {user.first_name}!**\n\n"
-                    f"I'm your AI-powered technical analysis assistant.\n\n"
-                    f"**Your Info:**\n"
-                    f"• ID: {user.id}\n"
-                    f"• Username: @{user.username or 'no_username'}\n\n"
-                    f"**How to use:**\n"
-                    f"1️⃣ Send me any trading chart image\n"
-                    f"2️⃣ I'll analyze it with AI\n"
-                    f"3️⃣ Get detailed technical analysis\n\n"
-                    f"**Commands:**\n"
-                    f"• /start - This message\n"
-                    f"• /analyze - Instructions for analysis\n"
-                    f"• /help - Get help\n\n"
-                    f"📊 Just send me a chart image to start!"
-                )
+                message = _START_TEMPLATE.format_map({
+                    "first_name": user.first_name,
+                    "user_id": user.id,
+                    "username": user.username or "no_username",
+                })
                 await update.message.reply_text(message, parse_mode='Markdown')
-                logger.info(f"👤 User {user.id} ({user.username}) started the bot")
+                logger.info("👤 User %s (%s) started the bot", user.id, user.username)
             
             async def analyze_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-                message = (
-                    "📊 **How to Analyze Charts**\n\n"
-                    "Simply send me a chart image and I'll analyze it!\n\n"
-                    "**Supported formats:** PNG, JPG, JPEG\n"
-                    "**Max size:** 5MB\n\n"
-                    "**What I analyze:**\n"
-                    "• 📈 Trend direction\n"
-                    "• 🎯 Support/Resistance levels\n"
-                    "• 📐 Chart patterns\n"
-                    "• 📊 Volume (if visible)\n"
-                    "• 🎪 Price targets\n"
-                    "• ⚠️ Risk assessment\n\n"
-                    "Send me a chart image now!"
-                )
-                await update.message.reply_text(message, parse_mode='Markdown')
-                logger.info(f"👤 User {update.effective_user.id} requested analyze info")
+                await update.message.reply_text(_ANALYZE_MESSAGE, parse_mode='Markdown')
+                logger.info("👤 User %s requested analyze info", update.effective_user.id)
                 
             async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-                message = (
-                    "📚 **SoliTrader AI Assistant Help**\n\n"
-                    "**Available Commands:**\n"
-                    "• /start - Welcome message\n"
-                    "• /analyze - How to analyze charts\n"
-                    "• /help - Show this help\n\n"
-                    "**To analyze a chart:**\n"
-                    "Just send me any trading chart image!\n\n"
-                    "**Supported formats:** PNG, JPG, JPEG (max 5MB)\n\n"
-                    "⚠️ *Analysis is for educational purposes only*"
-                )
-                await update.message.reply_text(message, parse_mode='Markdown')
-                logger.info(f"👤 User {update.effective_user.id} requested help")
+                await update.message.reply_text(_HELP_MESSAGE, parse_mode='Markdown')
+                logger.info("👤 User %s requested help", update.effective_user.id)
             
             # Add handlers
             self.app.add_handler(CommandHandler("start", start_command))
@@ -128,7 +168,7 @@ class TelegramBot:
             return True
             
         except Exception as e:
-            logger.error(f"❌ Setup error: {e}")
+            logger.error("❌ Setup error: %s", e)
             return False
     
    
@@ -170,6 +210,13 @@ class TelegramBot:
                 return
             # ──────────────────────────────────────────────────────────
 
+            if image_handler is None or ai_analyzer is None:
+                await message.reply_text(
+                    "❌ **System error**\n\nAnalysis modules not available. Please contact support.",
+                    parse_mode="Markdown",
+                )
+                return
+
             # Size sanity-check (5 MB hard limit)
             max_bytes = 5 * 1024 * 1024
             if tg_file_obj.file_size and tg_file_obj.file_size > max_bytes:
@@ -181,24 +228,21 @@ class TelegramBot:
                 )
                 return
 
-            # Send a “processing” placeholder
-            processing_msg = await message.reply_text(
-                "📊 **Image received!**\n\n"
-                "🤖 AI is analyzing your chart…\n"
-                "⏱️ Usually takes 10-30 seconds.",
-                parse_mode="Markdown",
-            )
-
-            # Import helpers (keeps top-level imports minimal inside Docker)
-            import sys
-
-            sys.path.append("/app")
-            from utils.image_handler import image_handler
-            from utils.ai_analyzer import ai_analyzer
-
             # Download the file from Telegram
-            telegram_file = await context.bot.get_file(tg_file_obj.file_id)
-            file_path = await image_handler.download_telegram_image(telegram_file, file_ext)
+            async def _download() -> str | None:
+                telegram_file = await context.bot.get_file(tg_file_obj.file_id)
+                return await image_handler.download_telegram_image(telegram_file, file_ext)
+
+            # Send a “processing” placeholder while the download runs
+            processing_msg, file_path = await asyncio.gather(
+                message.reply_text(
+                    "📊 **Image received!**\n\n"
+                    "🤖 AI is analyzing your chart…\n"
+                    "⏱️ Usually takes 10-30 seconds.",
+                    parse_mode="Markdown",
+                ),
+                _download(),
+            )
 
             if not file_path:
                 await processing_msg.edit_text(
@@ -207,18 +251,31 @@ class TelegramBot:
                 )
                 return
 
-            # Validate / normalise the image
-            is_valid, validation_message = await image_handler.validate_and_process_image(file_path)
-            if not is_valid:
-                await processing_msg.edit_text(
-                    f"❌ **Invalid image**\n\n{validation_message}\n\n"
-                    f"Please send a clear chart screenshot (PNG/JPG, ≤ 5 MB).",
-                    parse_mode="Markdown",
-                )
-                return
-
-            # Run GPT-4o Vision analysis
-            analysis_result = await ai_analyzer.analyze_chart(file_path, user.id)
+            # Keep the chart on disk until analysis is done – a queued chart
+            # may wait longer than the cleanup delay
+            with image_handler.in_use(file_path):
+                # Validate / normalise the image
+                is_valid, validation_message = await image_handler.validate_and_process_image(file_path)
+                if not is_valid:
+                    await processing_msg.edit_text(
+                        f"❌ **Invalid image**\n\n{validation_message}\n\n"
+                        f"Please send a clear chart screenshot (PNG/JPG, ≤ 5 MB).",
+                        parse_mode="Markdown",
+                    )
+                    return
+
+                # Run GPT-4o Vision analysis (bounded – excess requests wait in line)
+                if _AI_SEM.locked():
+                    await processing_msg.edit_text(
+                        "⏳ **In queue…**\n\n"
+                        "Other charts are being analyzed – yours is next in line.",
+                        parse_mode="Markdown",
+                    )
+                async with _AI_SEM:
+                    api_result = await ai_analyzer.analyze_chart(file_path)
+
+            # Parse (orjson) and validate the model's JSON reply
+            analysis_result = await ai_analyzer.process_analysis_result(api_result)
 
             # Format and send the answer
             analysis_text = ai_analyzer.format_analysis_message(analysis_result)
@@ -230,12 +287,6 @@ class TelegramBot:
                 analysis_result.get("success", False),
             )
 
-        except ImportError as e:
-            logger.error("❌ Import error: %s", e, exc_info=True)
-            await message.reply_text(
-                "❌ **System error**\n\nAnalysis modules not available. Please contact support.",
-                parse_mode="Markdown",
-            )
         except Exception as e:
             logger.error("❌ Error handling image: %s", e, exc_info=True)
             await message.reply_text(
@@ -260,31 +311,44 @@ class TelegramBot:
             await self.app.start()
             logger.info("✅ Bot started")
             
-            # Start polling
-            await self.app.updater.start_polling()
-            logger.info("✅ Polling started - Bot is now live!")
+            if self.webhook_url:
+                # Telegram pushes updates to us – no long-poll connection
+                await self.app.updater.start_webhook(
+                    listen="0.0.0.0",
+                    port=int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443')),
+                    url_path=urlparse(self.webhook_url).path.lstrip("/"),
+                    webhook_url=self.webhook_url,
+                    secret_token=os.getenv('TELEGRAM_WEBHOOK_SECRET') or None,
+                )
+                logger.info("✅ Webhook started - Bot is now live!")
+            else:
+                # Start polling
+                await self.app.updater.start_polling()
+                logger.info("✅ Polling started - Bot is now live!")
             logger.info("📱 Bot ready to analyze charts!")
             logger.info("   Send any trading chart image to get AI analysis")
             
-            # Keep running
-            while True:
-                await asyncio.sleep(1)
+            # Keep running until stop() is called
+            await self._stop.wait()
                 
         except Exception as e:
-            logger.error(f"❌ Start error: {e}")
+            logger.error("❌ Start error: %s", e)
             raise
     
     async def stop(self):
         """Stop the bot gracefully"""
+        self._stop.set()
         if self.app:
             try:
                 logger.info("🛑 Stopping bot...")
                 await self.app.updater.stop()
                 await self.app.stop()
                 await self.app.shutdown()
+                if ai_analyzer is not None:
+                    await ai_analyzer.aclose()
                 logger.info("✅ Bot stopped gracefully")
             except Exception as e:
-                logger.error(f"Error stopping bot: {e}")
+                logger.error("Error stopping bot: %s", e)
 
 async def main():
     """Main entry point"""
@@ -293,13 +357,14 @@ async def main():
     
     bot = TelegramBot()
     
-    # Setup signal handlers for graceful shutdown
+    # Setup signal handlers for graceful shutdown: wake bot.start() instead
+    # of raising KeyboardInterrupt through the loop
     def signal_handler():
         logger.info("🛑 Received shutdown signal")
-        raise KeyboardInterrupt
+        bot._stop.set()
     
     # Handle shutdown signals
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     for sig in [signal.SIGTERM, signal.SIGINT]:
         loop.add_signal_handler(sig, signal_handler)
     
@@ -309,13 +374,12 @@ async def main():
             logger.error("❌ Bot setup failed")
             return
             
-        # Start bot
+        # Start bot – returns once a shutdown signal arrives
         await bot.start()
-        
-    except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by signal")
+        
     except Exception as e:
-        logger.error(f"💥 Bot crashed: {e}")
+        logger.error("💥 Bot crashed: %s", e)
         import traceback
         traceback.print_exc()
     finally:
@@ -324,6 +388,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        uvloop.run(main())
     except KeyboardInterrupt:
         pass
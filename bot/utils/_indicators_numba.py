@@ -0,0 +1,190 @@
+"""
+Numba kernels for the indicator snapshot.
+
+Every function takes contiguous ``float64`` arrays (oldest → newest) and
+returns arrays of the same length, with ``NaN`` for the warm-up bars.
+Kernels release the GIL, so they can run in a worker thread without
+stalling the event loop. Without numba installed the same code runs as
+plain Python.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is optional at runtime
+
+    def njit(*args, **kwargs):  # type: ignore[no-redef]
+        """No-op stand-in for ``numba.njit``."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    """Exponential moving average seeded with the SMA of the first *n* bars."""
+    size = x.shape[0]
+    out = np.full(size, np.nan)
+    if size < n:
+        return out
+
+    acc = 0.0
+    for i in range(n):
+        acc += x[i]
+    acc /= n
+    out[n - 1] = acc
+
+    alpha = 2.0 / (n + 1.0)
+    for i in range(n, size):
+        acc = alpha * x[i] + (1.0 - alpha) * acc
+        out[i] = acc
+    return out
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def rsi(x: np.ndarray, n: int) -> np.ndarray:
+    """Wilder's relative strength index."""
+    size = x.shape[0]
+    out = np.full(size, np.nan)
+    if size <= n:
+        return out
+
+    gain = 0.0
+    loss = 0.0
+    for i in range(1, n + 1):
+        d = x[i] - x[i - 1]
+        if d > 0:
+            gain += d
+        else:
+            loss -= d
+    avg_gain = gain / n
+    avg_loss = loss / n
+    out[n] = 100.0 if avg_loss == 0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    for i in range(n + 1, size):
+        d = x[i] - x[i - 1]
+        up = d if d > 0 else 0.0
+        down = -d if d < 0 else 0.0
+        avg_gain = (avg_gain * (n - 1) + up) / n
+        avg_loss = (avg_loss * (n - 1) + down) / n
+        out[i] = 100.0 if avg_loss == 0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def macd(
+    x: np.ndarray, fast: int, slow: int, signal: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return ``(macd_line, signal_line, histogram)``."""
+    line = ema(x, fast) - ema(x, slow)
+    sig = np.full(x.shape[0], np.nan)
+    if x.shape[0] >= slow:
+        sig[slow - 1:] = ema(line[slow - 1:], signal)
+    return line, sig, line - sig
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def macd_last(x: np.ndarray, fast: int, slow: int, signal: int) -> Tuple[float, float, float]:
+    """
+    Return ``(macd_line, signal_line, histogram)`` for the last bar only.
+
+    Same recurrences as :func:`macd`, run as scalars in a single pass
+    without allocating the intermediate series.
+    """
+    size = x.shape[0]
+    if size < slow + signal - 1:
+        return np.nan, np.nan, np.nan
+
+    a_fast = 2.0 / (fast + 1.0)
+    a_slow = 2.0 / (slow + 1.0)
+    a_sig = 2.0 / (signal + 1.0)
+
+    ema_fast = 0.0
+    for i in range(fast):
+        ema_fast += x[i]
+    ema_fast /= fast
+    for i in range(fast, slow):
+        ema_fast = a_fast * x[i] + (1.0 - a_fast) * ema_fast
+
+    ema_slow = 0.0
+    for i in range(slow):
+        ema_slow += x[i]
+    ema_slow /= slow
+
+    # signal EMA is seeded with the SMA of the first *signal* MACD values
+    line = ema_fast - ema_slow
+    sig = line
+    for i in range(slow, slow + signal - 1):
+        ema_fast = a_fast * x[i] + (1.0 - a_fast) * ema_fast
+        ema_slow = a_slow * x[i] + (1.0 - a_slow) * ema_slow
+        line = ema_fast - ema_slow
+        sig += line
+    sig /= signal
+
+    for i in range(slow + signal - 1, size):
+        ema_fast = a_fast * x[i] + (1.0 - a_fast) * ema_fast
+        ema_slow = a_slow * x[i] + (1.0 - a_slow) * ema_slow
+        line = ema_fast - ema_slow
+        sig = a_sig * line + (1.0 - a_sig) * sig
+    return line, sig, line - sig
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def bbands(
+    x: np.ndarray, n: int, k: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return ``(lower, mid, upper, percent_b)`` using the population std."""
+    size = x.shape[0]
+    lower = np.full(size, np.nan)
+    mid = np.full(size, np.nan)
+    upper = np.full(size, np.nan)
+    perc = np.full(size, np.nan)
+
+    for i in range(n - 1, size):
+        s = 0.0
+        for j in range(i - n + 1, i + 1):
+            s += x[j]
+        m = s / n
+        var = 0.0
+        for j in range(i - n + 1, i + 1):
+            var += (x[j] - m) * (x[j] - m)
+        band = k * np.sqrt(var / n)
+
+        mid[i] = m
+        lower[i] = m - band
+        upper[i] = m + band
+        if band > 0:
+            perc[i] = (x[i] - lower[i]) / (2.0 * band)
+    return lower, mid, upper, perc
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int) -> np.ndarray:
+    """Wilder's average true range."""
+    size = close.shape[0]
+    out = np.full(size, np.nan)
+    if size < n:
+        return out
+
+    tr = np.empty(size)
+    tr[0] = high[0] - low[0]
+    for i in range(1, size):
+        hl = high[i] - low[i]
+        hc = abs(high[i] - close[i - 1])
+        lc = abs(low[i] - close[i - 1])
+        tr[i] = max(hl, hc, lc)
+
+    acc = 0.0
+    for i in range(n):
+        acc += tr[i]
+    acc /= n
+    out[n - 1] = acc
+    for i in range(n, size):
+        acc = (acc * (n - 1) + tr[i]) / n
+        out[i] = acc
+    return out
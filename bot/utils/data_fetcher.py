@@ -1,8 +1,14 @@
-import os, time, finnhub, pandas as pd
+import asyncio, os, time, httpx, numpy as np, orjson, pandas as pd
 
 import logging
 
-_FINN = finnhub.Client(api_key=os.getenv("FINNHUB_API_KEY"))
+_FINNHUB_URL = "https://finnhub.io/api/v1/crypto/candle"
+# shared keep-alive client, reused for every candle request
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+)
 
 logger = logging.getLogger(__name__)
 
@@ -10,15 +16,47 @@ logger = logging.getLogger(__name__)
 RES = {"1m":"1", "5m":"5", "15m":"15", "30m":"30",
        "1h":"60", "4h":"240", "1d":"D", "1w":"W"}
 
-def fetch_ohlcv(symbol: str, tf: str, lookback_days: int = 180) -> pd.DataFrame:
-    """Return a dataframe with utc timestamp index and OHLCV cols."""
+# seconds a fetched frame stays fresh, per timeframe
+_TTL = {"1m":60, "5m":120, "15m":300, "30m":600,
+        "1h":900, "4h":3600, "1d":3600, "1w":3600}
+
+# (symbol, tf) -> (fetched_at, dataframe)
+_CACHE: dict[tuple[str, str], tuple[float, pd.DataFrame]] = {}
+# one lock per key so concurrent callers share a single Finnhub request
+_LOCKS: dict[tuple[str, str], asyncio.Lock] = {}
+
+async def fetch_ohlcv(symbol: str, tf: str, lookback_days: int = 180) -> pd.DataFrame:
+    """
+    Return a dataframe with utc timestamp index and OHLCV cols.
+
+    Results are cached per (symbol, tf) for ``_TTL[tf]`` seconds; the
+    returned frame is shared, so callers must not modify it in place.
+    """
+    key = (symbol, tf)
+    async with _LOCKS.setdefault(key, asyncio.Lock()):
+        cached = _CACHE.get(key)
+        if cached and time.monotonic() - cached[0] < _TTL[tf]:
+            return cached[1]
+
+        df = await _fetch_candles(symbol, tf, lookback_days)
+        _CACHE[key] = (time.monotonic(), df)
+        return df
+
+
+async def _fetch_candles(symbol: str, tf: str, lookback_days: int) -> pd.DataFrame:
+    """Call Finnhub's crypto candle endpoint and build the dataframe."""
     now = int(time.time())
     _from = now - lookback_days * 24 * 3600
-    res = _FINN.crypto_candles(symbol, RES[tf], _from, now)
+    resp = await _HTTP.get(_FINNHUB_URL, params={
+        "symbol": symbol, "resolution": RES[tf], "from": _from, "to": now,
+        "token": os.getenv("FINNHUB_API_KEY"),
+    })
+    resp.raise_for_status()
+    res = orjson.loads(resp.content)
 
 
     # 📡  Log the outbound call so it shows up in docker logs
-    logger.info(
+    logger.debug(
          "📡 Finnhub call: symbol=%s tf=%s lookback=%d d status=%s rows=%s",
          symbol, tf, lookback_days,
          res.get("s", "?"),
@@ -30,8 +68,11 @@ def fetch_ohlcv(symbol: str, tf: str, lookback_days: int = 180) -> pd.DataFrame:
 
     if res["s"] != "ok":
         raise RuntimeError(f"Finnhub error: {res}")
-    df = pd.DataFrame(res)[["t","o","h","l","c","v"]]
-    df.columns = ["ts","open","high","low","close","volume"]
-    df["ts"] = pd.to_datetime(df["ts"], unit="s", utc=True)
-    return df.set_index("ts")
+    # typed datetime64 index built in one shot – no per-element conversion
+    ts = pd.DatetimeIndex(np.asarray(res["t"], dtype="datetime64[s]"), name="ts").tz_localize("UTC")
+    arr = np.empty((len(res["t"]), 5), dtype=np.float64)
+    for i, col in enumerate(("o", "h", "l", "c", "v")):
+        arr[:, i] = np.asarray(res[col], dtype=np.float64)
+    df = pd.DataFrame(arr, index=ts, columns=["open","high","low","close","volume"], copy=False)
+    return df
 
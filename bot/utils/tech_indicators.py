@@ -5,57 +5,60 @@ Build a quick snapshot (RSI, MACD, …) for the current dataframe.
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict, List
+from typing import List, Union
 
 import numpy as np
-
-# ----------------------------------------------------------------------
-#  PATCH for NumPy 2  → add the legacy alias that pandas-ta requires
-# ----------------------------------------------------------------------
-if not hasattr(np, "NaN"):  # NumPy <2 has it, NumPy 2 removed it
-    np.NaN = np.nan  # type: ignore[attr-defined]  # noqa: N806
-
 import pandas as pd
-import pandas_ta as ta  # noqa: E402  (import after patch)
+
+from bot.utils import _indicators_numba as _nb
 
 logger = logging.getLogger(__name__)
 
+# Only the last bar is reported, so indicators run on this many trailing bars
+_TAIL_BARS = 200
+
 
 def _fmt(value: float, digits: int = 2) -> str:
     """Human-friendly float formatting."""
     return f"{value:.{digits}f}"
 
 
-def build_indicator_snapshot(df: pd.DataFrame) -> str:
+def add_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Return a short, bullet-point text block with popular indicators that
-    will be appended to the OpenAI prompt.
-
-    Parameters
-    ----------
-    df
-        OHLCV dataframe produced by ``data_fetcher.fetch_ohlcv``.
-        **Index must be in chronological order (oldest → newest).**
+    Add EMA / RSI / MACD / Bollinger / ATR columns to *df* in place.
 
-    Returns
-    -------
-    str
-        Ready-for-prompt, markdown-friendly text.
+    Column names follow the pandas-ta convention (``EMA_50``, ``RSI_14``,
+    ``MACDh_12_26_9``, ``BBP_20_2.0`` …). Returns *df* for chaining.
     """
-    # Safety – need at least ~100 bars for most indicators
-    if len(df) < 120:
-        logger.warning("Not enough data for indicators – rows=%d", len(df))
-        return "No live indicators – insufficient history."
-
-    close = df["close"]
+    close = np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64))
+    high = np.ascontiguousarray(df["high"].to_numpy(dtype=np.float64))
+    low = np.ascontiguousarray(df["low"].to_numpy(dtype=np.float64))
+
+    df["EMA_50"] = _nb.ema(close, 50)
+    df["EMA_200"] = _nb.ema(close, 200)
+    df["RSI_14"] = _nb.rsi(close, 14)
+    df["MACD_12_26_9"], df["MACDs_12_26_9"], df["MACDh_12_26_9"] = _nb.macd(close, 12, 26, 9)
+    (
+        df["BBL_20_2.0"],
+        df["BBM_20_2.0"],
+        df["BBU_20_2.0"],
+        df["BBP_20_2.0"],
+    ) = _nb.bbands(close, 20, 2.0)
+    df["ATR_14"] = _nb.atr(high, low, close, 14)
+    return df
+
+
+def _compute(close: np.ndarray) -> List[str]:
+    """Indicator bullet lines for a chronological float64 close array."""
+    # One contiguous float64 view of the tail – every indicator reads from it
+    close_tail = np.ascontiguousarray(close[-_TAIL_BARS:], dtype=np.float64)
 
     # --- Simple indicators ------------------------------------------------
-    rsi = ta.rsi(close, length=14).iloc[-1]
-    macd = ta.macd(close, fast=12, slow=26, signal=9)
-    macd_hist = macd["MACDh_12_26_9"].iloc[-1]
-    bb = ta.bbands(close, length=20)
-    bb_perc = bb["BBP_20_2.0"].iloc[-1] * 100  # % position in the band
+    rsi = _nb.rsi(close_tail, 14)[-1]
+    macd_hist = _nb.macd_last(close_tail, 12, 26, 9)[2]
+    bb_perc = _nb.bbands(close_tail, 20, 2.0)[3][-1] * 100  # % position in the band
 
     indicator_lines: List[str] = [
         f"• **RSI (14)**: {_fmt(rsi)}",
@@ -64,11 +67,44 @@ def build_indicator_snapshot(df: pd.DataFrame) -> str:
     ]
 
     # --- Trend detection (200-SMA vs price) -------------------------------
-    sma200 = ta.sma(close, length=200).iloc[-1]
-    trend = "↑ Uptrend" if close.iloc[-1] > sma200 else "↓ Downtrend"
+    sma200 = close_tail[-200:].mean()
+    trend = "↑ Uptrend" if close_tail[-1] > sma200 else "↓ Downtrend"
     indicator_lines.append(f"• **Trend (200-SMA)**: {trend}")
 
     # You can add more metrics here (ATR, ADX, …) as needed
+    return indicator_lines
+
+
+def build_indicator_snapshot(data: Union[pd.DataFrame, np.ndarray]) -> str:
+    """
+    Return a short, bullet-point text block with popular indicators that
+    will be appended to the OpenAI prompt.
+
+    Parameters
+    ----------
+    data
+        OHLCV dataframe produced by ``data_fetcher.fetch_ohlcv``, or the
+        close prices as a NumPy array (used as-is, no copy).
+        **Rows must be in chronological order (oldest → newest).**
+
+    Returns
+    -------
+    str
+        Ready-for-prompt, markdown-friendly text.
+    """
+    close = data["close"].to_numpy() if isinstance(data, pd.DataFrame) else data
+
+    # Safety – need at least ~100 bars for most indicators
+    if len(close) < 120:
+        logger.warning("Not enough data for indicators – rows=%d", len(close))
+        return "No live indicators – insufficient history."
+
+    indicator_lines = _compute(close)
     logger.info("✅ Indicator snapshot built")
     return "\n".join(indicator_lines)
 
+
+async def build_indicator_snapshot_async(data: Union[pd.DataFrame, np.ndarray]) -> str:
+    """:func:`build_indicator_snapshot` run in a worker thread."""
+    close = data["close"].to_numpy() if isinstance(data, pd.DataFrame) else data
+    return await asyncio.to_thread(build_indicator_snapshot, close)
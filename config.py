@@ -2,8 +2,11 @@
 TG-Trade Suite Configuration
 """
 import os
-from typing import Optional
-from pydantic import BaseSettings, validator
+import re
+from functools import cached_property, lru_cache
+from typing import FrozenSet, Optional
+from pydantic import TypeAdapter, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,9 +14,17 @@ load_dotenv()
 class Config(BaseSettings):
     """Application configuration"""
     
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
+        frozen=True,
+        extra="ignore",
+    )
+    
     # Telegram Bot Settings
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_WEBHOOK_URL: Optional[str] = None
+    TELEGRAM_USE_WEBHOOK: bool = False
     
     # Database Settings
     DATABASE_URL: str
@@ -47,7 +58,10 @@ class Config(BaseSettings):
     MAX_FILE_SIZE: int = 5242880  # 5MB
     IMAGE_RETENTION_SECONDS: int = 60
     IMAGE_CLEANUP_ENABLED: bool = True
-    ALLOWED_EXTENSIONS: set = {"png", "jpg", "jpeg"}
+    ALLOWED_EXTENSIONS: FrozenSet[str] = frozenset({"png", "jpg", "jpeg"})
+    # Public URL the API serves UPLOAD_FOLDER under; lets OpenAI fetch charts
+    # by link instead of receiving them base64-encoded
+    IMAGE_PUBLIC_BASE_URL: Optional[str] = None
     
     # Redis Settings
     REDIS_URL: str = "redis://redis:6379/0"
@@ -60,35 +74,36 @@ class Config(BaseSettings):
     # Monitoring Settings
     LOG_LEVEL: str = "INFO"
     
-    @validator('TELEGRAM_BOT_TOKEN')
+    @field_validator('TELEGRAM_BOT_TOKEN')
+    @classmethod
     def validate_telegram_token(cls, v):
         if not v or v == "YOUR_BOT_TOKEN_FROM_BOTFATHER":
             raise ValueError('TELEGRAM_BOT_TOKEN is required - get it from @BotFather')
         return v
     
-    @validator('OPENAI_API_KEY')
+    @field_validator('OPENAI_API_KEY')
+    @classmethod
     def validate_openai_key(cls, v):
         if not v or v == "YOUR_OPENAI_API_KEY_HERE":
             raise ValueError('OPENAI_API_KEY is required - get it from OpenAI')
         return v
     
-    @validator('DATABASE_URL')
+    @field_validator('DATABASE_URL')
+    @classmethod
     def validate_database_url(cls, v):
         if not v:
             raise ValueError('DATABASE_URL is required')
         return v
     
-    @property
+    # Settings never change after load, so derived flags are computed once
+    @cached_property
     def is_production(self) -> bool:
         return not self.DEBUG
     
-    @property
+    @cached_property
     def webhook_enabled(self) -> bool:
-        return bool(self.TELEGRAM_WEBHOOK_URL)
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+        return self.TELEGRAM_USE_WEBHOOK and bool(self.TELEGRAM_WEBHOOK_URL)
+
 
 # Chart Analysis Prompt Template
 CHART_ANALYSIS_PROMPT = """
@@ -191,5 +206,61 @@ Need help? Contact @support
     """
 }
 
-# Load configuration instance
-config = Config()
+# File names with an allowed image extension (matches ALLOWED_EXTENSIONS)
+_IMG_EXT_RE = re.compile(r"\.(png|jpe?g)$", re.IGNORECASE)
+
+
+def is_image_name(name: str) -> bool:
+    """True if *name* ends in one of the allowed image extensions."""
+    return _IMG_EXT_RE.search(name) is not None
+
+
+_BOOL = TypeAdapter(bool)
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Boolean env var parsed exactly like a ``bool`` settings field
+    ("1"/"true"/"yes"/"on" …); raises ``ValidationError`` on anything else.
+    """
+    value = os.getenv(name)
+    return default if value is None else _BOOL.validate_python(value)
+
+
+class AnalyzerSettings(BaseSettings):
+    """
+    The subset of settings the chart analyzer needs. Loaded on its own so a
+    missing database or JWT secret does not switch analysis off.
+    """
+    
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
+        frozen=True,
+        extra="ignore",
+    )
+    
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o"
+    OPENAI_MAX_TOKENS: int = 1000
+    OPENAI_TEMPERATURE: float = 0.1
+    IMAGE_PUBLIC_BASE_URL: Optional[str] = None
+
+
+@lru_cache(maxsize=1)
+def get_analyzer_settings() -> AnalyzerSettings:
+    """Return the analyzer settings, validated once on first call."""
+    return AnalyzerSettings()
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Config:
+    """Return the process-wide settings, validated once on first call."""
+    return Config()
+
+def __getattr__(name: str):
+    # ``config`` is loaded on first access, so importing the prompt and
+    # message constants does not require a complete environment
+    if name == "config":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Make the top-level packages importable and keep ImageHandler's upload
+# folder out of /app when the suite runs outside the container
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("UPLOAD_FOLDER", tempfile.mkdtemp(prefix="uploads-"))
@@ -0,0 +1,167 @@
+"""Parsing, validation and request building in utils.ai_analyzer."""
+import base64
+import os
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from utils.ai_analyzer import (
+    _B64_CHUNK,
+    AIAnalyzer,
+    _b64_chunked,
+    _b64_mmap,
+    _coerce_prices,
+    _detect_symbol_tf,
+    _read_and_encode,
+)
+
+
+class _FakeBatchClient:
+    """Records what submit_batch uploads instead of calling OpenAI."""
+
+    def __init__(self):
+        self.uploaded = b""
+        self.files = SimpleNamespace(create=self._create_file)
+        self.batches = SimpleNamespace(create=self._create_batch)
+
+    async def _create_file(self, file, purpose):
+        self.uploaded = file[1]
+        return SimpleNamespace(id="file-1")
+
+    async def _create_batch(self, **kwargs):
+        return SimpleNamespace(id="batch-1")
+
+
+@pytest.fixture
+def chart(tmp_path):
+    path = tmp_path / "chart_a.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_sends_each_chart_once(chart, tmp_path):
+    other = tmp_path / "chart_b.png"
+    other.write_bytes(chart.read_bytes())
+    analyzer = AIAnalyzer()
+    analyzer.client = client = _FakeBatchClient()
+
+    assert await analyzer.submit_batch([chart, str(chart), other]) == "batch-1"
+
+    ids = [orjson.loads(line)["custom_id"] for line in client.uploaded.splitlines()]
+    assert ids == [str(chart), str(other)]
+
+
+def test_validate_analysis_data_replaces_nulls_with_defaults():
+    data = dict.fromkeys(
+        ("trend", "market_bias", "risk_level", "confidence", "key_insights",
+         "summary", "volume_analysis", "timeframe_detected", "stop_loss_level",
+         "support_levels", "patterns")
+    )
+    validated = AIAnalyzer._validate_analysis_data(data)
+    assert validated["trend"] == "sideways"
+    assert validated["market_bias"] == "neutral"
+    assert validated["risk_level"] == "medium"
+    assert validated["confidence"] == 0.5
+    assert validated["key_insights"] == "Analysis completed."
+    assert validated["summary"] == "Chart analysis completed."
+    assert validated["volume_analysis"] is None
+    assert validated["stop_loss_level"] is None
+    assert validated["support_levels"] == []
+    assert validated["patterns"] == []
+
+
+def test_validate_analysis_data_normalises_wrong_types():
+    validated = AIAnalyzer._validate_analysis_data({
+        "trend": "UPTREND",
+        "market_bias": 1,
+        "confidence": "high",
+        "stop_loss_level": "41000",
+        "key_insights": 42,
+        "patterns": ["flag", None, ""],
+    })
+    assert validated["trend"] == "uptrend"
+    assert validated["market_bias"] == "neutral"
+    assert validated["confidence"] == 0.5
+    assert validated["stop_loss_level"] is None
+    assert validated["key_insights"] == "42"
+    assert validated["patterns"] == ["flag"]
+
+
+@pytest.mark.asyncio
+async def test_null_fields_format_without_error():
+    content = orjson.dumps({"key_insights": None, "summary": None, "trend": None})
+    analysis = await AIAnalyzer().process_analysis_result(
+        {"success": True, "content": content}
+    )
+    assert analysis["success"] is True
+    message = AIAnalyzer.format_analysis_message(analysis)
+    assert "Analysis completed." in message
+
+
+@pytest.mark.asyncio
+async def test_no_key_response_passes_through_processing():
+    analyzer = AIAnalyzer()
+    analyzer.client = None
+    result = await analyzer.process_analysis_result(await analyzer.analyze_chart("x.png"))
+    assert result["success"] is False
+    assert "API key not configured" in AIAnalyzer.format_analysis_message(result)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("BTCUSDT_1h.png", ("BINANCE:BTCUSDT", "1h")),
+        ("/tmp/up/ethusdt_15m.jpg", ("BINANCE:ETHUSDT", "15m")),
+        ("sol_usdt_4h.jpeg", ("BINANCE:SOL_USDT", "4h")),
+        ("BTCUSDT_1hx.png", None),
+        ("BTCUSDT_1h_old.png", None),
+        ("chart_Zm9vYmFyYmF6cXV4.png", None),
+        ("_1h.png", None),
+        ("1h", None),
+    ],
+)
+def test_detect_symbol_tf_matches_the_whole_stem(name, expected):
+    assert _detect_symbol_tf(name) == expected
+
+
+@pytest.mark.parametrize(
+    "levels, expected",
+    [
+        ([1.5, 2, float("nan"), float("inf"), -float("inf"), 3.0], [1.5, 2.0, 3.0]),
+        (["100", None, True, 4], [4.0]),
+        ("1,2,3", []),
+        (None, []),
+    ],
+)
+def test_coerce_prices_keeps_finite_numbers(levels, expected):
+    assert _coerce_prices(levels) == expected
+
+
+def test_non_finite_prices_never_reach_the_message():
+    validated = AIAnalyzer._validate_analysis_data(
+        {"support_levels": [float("inf"), 100.5], "stop_loss_level": float("-inf")}
+    )
+    assert validated["support_levels"] == [100.5]
+    assert validated["stop_loss_level"] is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "size", [1, 2, 3, _B64_CHUNK - 1, _B64_CHUNK, _B64_CHUNK + 1, 3 * _B64_CHUNK + 2]
+)
+async def test_chunked_and_mmap_encoders_agree(tmp_path, size):
+    path = tmp_path / "chart.bin"
+    data = os.urandom(size)
+    path.write_bytes(data)
+    expected = base64.b64encode(data).decode("ascii")
+    assert _b64_mmap(path) == expected
+    assert await _b64_chunked(path) == expected
+
+
+@pytest.mark.asyncio
+async def test_empty_file_falls_back_to_chunked(tmp_path):
+    path = tmp_path / "empty.png"
+    path.write_bytes(b"")
+    assert await _read_and_encode(path) == ""
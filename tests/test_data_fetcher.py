@@ -0,0 +1,55 @@
+"""Per-(symbol, tf) TTL cache in front of Finnhub in bot.utils.data_fetcher."""
+import asyncio
+import time
+
+import pytest
+
+from bot.utils import data_fetcher
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def fake_fetch(symbol, tf, lookback_days):
+        calls.append((symbol, tf))
+        await asyncio.sleep(0.01)
+        return object()
+
+    monkeypatch.setattr(data_fetcher, "_fetch_candles", fake_fetch)
+    monkeypatch.setattr(data_fetcher, "_CACHE", {})
+    monkeypatch.setattr(data_fetcher, "_LOCKS", {})
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_fresh_frame_is_reused(calls):
+    first = await data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "1h")
+    assert await data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "1h") is first
+    assert calls == [("BINANCE:BTCUSDT", "1h")]
+
+
+@pytest.mark.asyncio
+async def test_keys_are_per_symbol_and_timeframe(calls):
+    await data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "1h")
+    await data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "4h")
+    await data_fetcher.fetch_ohlcv("BINANCE:ETHUSDT", "1h")
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_stale_frame_is_refetched(calls):
+    first = await data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "1m")
+    key = ("BINANCE:BTCUSDT", "1m")
+    data_fetcher._CACHE[key] = (time.monotonic() - data_fetcher._TTL["1m"] - 1, first)
+    assert await data_fetcher.fetch_ohlcv(*key) is not first
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_request(calls):
+    frames = await asyncio.gather(
+        *(data_fetcher.fetch_ohlcv("BINANCE:BTCUSDT", "1h") for _ in range(5))
+    )
+    assert len(calls) == 1
+    assert all(frame is frames[0] for frame in frames)
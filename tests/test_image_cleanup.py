@@ -0,0 +1,86 @@
+"""Expiry handling of downloaded charts in utils.image_handler."""
+import asyncio
+
+import pytest
+
+from utils import image_handler as ih
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(ih, "_SWEEP_INTERVAL", 0.01)
+    handler = ih.ImageHandler()
+    handler.cleanup_delay = 0.02
+    return handler
+
+
+def _chart(handler, name="chart_a.png"):
+    path = handler.upload_folder / name
+    path.write_bytes(b"x")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_in_use_chart_outlives_its_expiry(handler):
+    path = _chart(handler)
+    with handler.in_use(str(path)):
+        handler._schedule_cleanup(path)
+        await asyncio.sleep(0.1)
+        assert path.exists()
+    await asyncio.sleep(0.1)
+    assert not path.exists()
+    assert handler._janitor_task is None
+
+
+@pytest.mark.asyncio
+async def test_janitor_removes_charts_in_expiry_order(handler):
+    first, second = _chart(handler, "chart_1.png"), _chart(handler, "chart_2.png")
+    handler.remember_base64(first, "AAAA")
+    handler._schedule_cleanup(first)
+    handler.cleanup_delay = 0.2
+    handler._schedule_cleanup(second)
+
+    await asyncio.sleep(0.1)
+    assert not first.exists() and second.exists()
+    assert handler.cached_base64(first) is None
+    await asyncio.sleep(0.2)
+    assert not second.exists()
+    await asyncio.sleep(0)
+    assert handler._janitor_task is None
+
+
+@pytest.mark.asyncio
+async def test_janitor_starts_one_task_per_burst(handler):
+    paths = [_chart(handler, f"chart_{i}.png") for i in range(5)]
+    for path in paths:
+        handler._schedule_cleanup(path)
+    task = handler._janitor_task
+    assert task is not None
+    await task
+    assert not any(path.exists() for path in paths)
+
+
+@pytest.mark.asyncio
+async def test_missing_files_do_not_stop_the_janitor(handler):
+    gone, kept = handler.upload_folder / "chart_gone.png", _chart(handler)
+    handler._schedule_cleanup(gone)
+    handler._schedule_cleanup(kept)
+    await handler._janitor_task
+    assert not kept.exists()
+
+
+@pytest.mark.asyncio
+async def test_sweeps_are_spaced_by_the_sweep_interval(handler, monkeypatch):
+    monkeypatch.setattr(ih, "_SWEEP_INTERVAL", 0.3)
+    first, second = _chart(handler, "chart_1.png"), _chart(handler, "chart_2.png")
+    handler.cleanup_delay = 0.01
+    handler._schedule_cleanup(first)
+    handler.cleanup_delay = 0.05
+    handler._schedule_cleanup(second)
+
+    await asyncio.sleep(0.15)
+    # second expired at 0.05 s but waits for the next sweep slot
+    assert not first.exists() and second.exists()
+    await asyncio.sleep(0.25)
+    assert not second.exists()
@@ -0,0 +1,65 @@
+"""Header probing in utils.image_handler (no Pillow decode involved)."""
+import io
+
+import pytest
+from PIL import Image
+
+from utils.image_handler import _peek_image_size
+
+
+def _jpeg(size=(640, 480), **save_kwargs) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, "white").save(buf, "JPEG", **save_kwargs)
+    return buf.getvalue()
+
+
+def _write(tmp_path, name: str, data: bytes):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+def test_baseline_jpeg(tmp_path):
+    data = _jpeg((640, 480), progressive=False)
+    assert b"\xff\xc0" in data
+    assert _peek_image_size(_write(tmp_path, "a.jpg", data)) == (640, 480)
+
+
+def test_progressive_jpeg(tmp_path):
+    data = _jpeg((800, 300), progressive=True)
+    assert b"\xff\xc2" in data
+    assert _peek_image_size(_write(tmp_path, "a.jpg", data)) == (800, 300)
+
+
+def test_jpeg_with_app_segments_before_sof(tmp_path):
+    exif = Image.Exif()
+    exif[0x010E] = "chart " * 200  # ImageDescription – a long APP1 segment
+    data = _jpeg((1024, 768), exif=exif.tobytes(), icc_profile=b"\0" * 4096)
+    assert data.index(b"\xff\xe1") < data.index(b"\xff\xc0")
+    assert _peek_image_size(_write(tmp_path, "a.jpg", data)) == (1024, 768)
+
+
+def test_png(tmp_path):
+    buf = io.BytesIO()
+    Image.new("RGB", (1920, 1080)).save(buf, "PNG")
+    assert _peek_image_size(_write(tmp_path, "a.png", buf.getvalue())) == (1920, 1080)
+
+
+@pytest.mark.parametrize("cut", [1, 2, 3, 20, -1])
+def test_truncated_before_frame_header(tmp_path, cut):
+    data = _jpeg((640, 480))
+    sof = data.index(b"\xff\xc0")
+    end = cut if cut > 0 else sof + 6  # -1: inside the SOF segment
+    assert _peek_image_size(_write(tmp_path, "a.jpg", data[:end])) is None
+
+
+def test_truncated_png(tmp_path):
+    assert _peek_image_size(_write(tmp_path, "a.png", b"\x89PNG\r\n\x1a\n\0\0")) is None
+
+
+def test_not_an_image(tmp_path):
+    assert _peek_image_size(_write(tmp_path, "a.jpg", b"GIF89a" + b"\0" * 64)) is None
+
+
+def test_missing_file(tmp_path):
+    assert _peek_image_size(tmp_path / "missing.jpg") is None
@@ -0,0 +1,153 @@
+"""Down-scaling charts to GPT-4o's high-detail size in utils.image_handler."""
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils import image_handler as ih
+
+
+@pytest.fixture
+def pillow_only(monkeypatch):
+    monkeypatch.setattr(ih, "pyvips", None)
+    monkeypatch.setattr(ih, "_turbo", None)
+
+
+def _save(path, size, **kwargs):
+    Image.new("RGB", size, "white").save(path, **kwargs)
+    return path
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [
+        ((3000, 2000), (1152, 768)),  # short side → 768
+        ((4000, 500), (2048, 256)),  # long side → 2048
+    ],
+)
+def test_vision_size(pillow_only, tmp_path, size, expected):
+    path = _save(tmp_path / "a.jpg", size)
+    ih._fit_for_vision(path, *size)
+    with Image.open(path) as im:
+        assert im.size == expected
+        assert im.format == "JPEG"
+
+
+def test_png_stays_png(pillow_only, tmp_path):
+    path = _save(tmp_path / "a.png", (2000, 1600))
+    ih._fit_for_vision(path, 2000, 1600)
+    with Image.open(path) as im:
+        assert (im.format, im.size) == ("PNG", (960, 768))
+
+
+@pytest.mark.asyncio
+async def test_validation_resizes_only_oversized_charts(pillow_only, tmp_path):
+    handler = ih.ImageHandler()
+    big = _save(tmp_path / "big.png", (3000, 2000))
+    small = _save(tmp_path / "small.png", (1200, 700))
+    before = small.read_bytes()
+
+    assert (await handler.validate_and_process_image(str(big)))[0]
+    assert (await handler.validate_and_process_image(str(small)))[0]
+    with Image.open(big) as im:
+        assert im.size == (1152, 768)
+    assert small.read_bytes() == before
+
+
+@pytest.mark.asyncio
+async def test_validation_rejects_tiny_and_corrupt_images(pillow_only, tmp_path):
+    handler = ih.ImageHandler()
+    tiny = _save(tmp_path / "tiny.png", (90, 4000))
+    corrupt = tmp_path / "corrupt.jpg"
+    corrupt.write_bytes(b"\xff\xd8" + b"\0" * 4096)
+
+    ok, reason = await handler.validate_and_process_image(str(tiny))
+    assert not ok and "too small" in reason
+    ok, reason = await handler.validate_and_process_image(str(corrupt))
+    assert not ok and reason.startswith("Invalid image file")
+
+
+class _FakeVips:
+    """Stand-in for ``pyvips``; records calls, optionally fails."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.Image = self
+
+    def thumbnail(self, path, width, height, size):
+        self.calls.append((width, height))
+        if self.fail:
+            raise RuntimeError("vips error")
+        return self
+
+    def jpegsave_buffer(self, **kwargs):
+        return b"vips-jpeg"
+
+    def pngsave_buffer(self):
+        return b"vips-png"
+
+
+class _FakeTurbo:
+    """Stand-in for ``TurboJPEG``; decodes to a blank bitmap, optionally fails."""
+
+    def __init__(self, fail=False):
+        self.scales = []
+        self.fail = fail
+
+    def decode(self, data, pixel_format, scaling_factor):
+        self.scales.append(scaling_factor)
+        if self.fail:
+            raise OSError("unsupported color conversion request")
+        return np.zeros((500, 750, 3), dtype=np.uint8)
+
+    def encode(self, pixels, quality, pixel_format):
+        return b"turbo-jpeg"
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    monkeypatch.setattr(ih, "TJPF_RGB", 0, raising=False)
+
+    def install(vips=None, turbo=None):
+        monkeypatch.setattr(ih, "pyvips", vips)
+        monkeypatch.setattr(ih, "_turbo", turbo)
+
+    return install
+
+
+def test_pyvips_is_tried_first(fakes, tmp_path):
+    vips, turbo = _FakeVips(), _FakeTurbo()
+    fakes(vips, turbo)
+    path = _save(tmp_path / "a.jpg", (3000, 2000))
+    ih._fit_for_vision(path, 3000, 2000)
+    assert vips.calls == [(1152, 768)]
+    assert turbo.scales == []
+    assert path.read_bytes() == b"vips-jpeg"
+
+
+def test_turbojpeg_takes_over_when_pyvips_fails(fakes, tmp_path):
+    vips, turbo = _FakeVips(fail=True), _FakeTurbo()
+    fakes(vips, turbo)
+    path = _save(tmp_path / "a.jpg", (3000, 2000))
+    ih._fit_for_vision(path, 3000, 2000)
+    assert turbo.scales == [(1, 2)]  # 0.384 × 2 ≤ 1, × 4 is not
+    assert path.read_bytes() == b"turbo-jpeg"
+
+
+def test_turbojpeg_is_skipped_for_png(fakes, tmp_path):
+    turbo = _FakeTurbo()
+    fakes(None, turbo)
+    path = _save(tmp_path / "a.png", (3000, 2000))
+    ih._fit_for_vision(path, 3000, 2000)
+    assert turbo.scales == []
+    with Image.open(path) as im:
+        assert (im.format, im.size) == ("PNG", (1152, 768))
+
+
+def test_pillow_handles_what_both_fast_paths_reject(fakes, tmp_path):
+    fakes(_FakeVips(fail=True), _FakeTurbo(fail=True))
+    path = tmp_path / "cmyk.jpg"
+    Image.new("CMYK", (3000, 2000)).save(path)
+    ih._fit_for_vision(path, 3000, 2000)
+    with Image.open(path) as im:
+        assert (im.format, im.size) == ("JPEG", (1152, 768))
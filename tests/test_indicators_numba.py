@@ -0,0 +1,128 @@
+"""Numba kernels in bot.utils._indicators_numba against plain references."""
+import numpy as np
+import pytest
+
+from bot.utils import _indicators_numba as kernels
+
+N_BARS = 300
+
+
+@pytest.fixture(scope="module")
+def ohlc():
+    rng = np.random.default_rng(7)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, N_BARS))
+    spread = rng.uniform(0.1, 2.0, N_BARS)
+    high = close + spread * rng.uniform(0.0, 1.0, N_BARS)
+    low = close - spread * rng.uniform(0.0, 1.0, N_BARS)
+    return high, low, close
+
+
+def _ema_ref(x, n):
+    out = [np.nan] * len(x)
+    if len(x) < n:
+        return np.array(out)
+    prev = sum(x[:n]) / n
+    out[n - 1] = prev
+    alpha = 2 / (n + 1)
+    for i in range(n, len(x)):
+        prev = alpha * x[i] + (1 - alpha) * prev
+        out[i] = prev
+    return np.array(out)
+
+
+def _rsi_ref(x, n):
+    out = [np.nan] * len(x)
+    diffs = np.diff(x)
+    gains = np.clip(diffs, 0, None)
+    losses = np.clip(-diffs, 0, None)
+    avg_gain, avg_loss = gains[:n].mean(), losses[:n].mean()
+    for i in range(n, len(x)):
+        if i > n:
+            avg_gain = (avg_gain * (n - 1) + gains[i - 1]) / n
+            avg_loss = (avg_loss * (n - 1) + losses[i - 1]) / n
+        out[i] = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.array(out)
+
+
+def _atr_ref(high, low, close, n):
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    tr = np.nanmax(
+        [high - low, np.abs(high - prev_close), np.abs(low - prev_close)], axis=0
+    )
+    out = [np.nan] * len(close)
+    acc = tr[:n].mean()
+    out[n - 1] = acc
+    for i in range(n, len(close)):
+        acc = (acc * (n - 1) + tr[i]) / n
+        out[i] = acc
+    return np.array(out)
+
+
+def _close(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("n", [2, 9, 20, 50])
+def test_ema(ohlc, n):
+    close = ohlc[2]
+    _close(kernels.ema(close, n), _ema_ref(close, n))
+
+
+def test_ema_shorter_than_period():
+    assert np.isnan(kernels.ema(np.arange(5.0), 10)).all()
+
+
+@pytest.mark.parametrize("n", [6, 14])
+def test_rsi(ohlc, n):
+    close = ohlc[2]
+    _close(kernels.rsi(close, n), _rsi_ref(close, n))
+
+
+def test_rsi_monotonic_rise_is_100():
+    assert kernels.rsi(np.arange(30.0), 14)[-1] == 100.0
+
+
+def test_macd(ohlc):
+    close = ohlc[2]
+    line, sig, hist = kernels.macd(close, 12, 26, 9)
+    ref_line = _ema_ref(close, 12) - _ema_ref(close, 26)
+    ref_sig = np.full(N_BARS, np.nan)
+    ref_sig[25:] = _ema_ref(ref_line[25:], 9)
+    _close(line, ref_line)
+    _close(sig, ref_sig)
+    _close(hist, ref_line - ref_sig)
+
+
+def test_macd_last_matches_full_series(ohlc):
+    close = ohlc[2]
+    full = kernels.macd(close, 12, 26, 9)
+    _close(np.array(kernels.macd_last(close, 12, 26, 9)), [s[-1] for s in full])
+
+
+def test_macd_last_too_short():
+    assert np.isnan(kernels.macd_last(np.arange(30.0), 12, 26, 9)).all()
+
+
+def test_bbands(ohlc):
+    close = ohlc[2]
+    n, k = 20, 2.0
+    lower, mid, upper, perc = kernels.bbands(close, n, k)
+    windows = np.lib.stride_tricks.sliding_window_view(close, n)
+    ref_mid = windows.mean(axis=1)
+    band = k * windows.std(axis=1)
+    _close(mid[n - 1:], ref_mid)
+    _close(lower[n - 1:], ref_mid - band)
+    _close(upper[n - 1:], ref_mid + band)
+    _close(perc[n - 1:], (close[n - 1:] - (ref_mid - band)) / (2 * band))
+    assert np.isnan(mid[: n - 1]).all()
+
+
+def test_bbands_flat_series_has_no_percent_b():
+    _, mid, _, perc = kernels.bbands(np.full(30, 5.0), 20, 2.0)
+    assert mid[-1] == 5.0
+    assert np.isnan(perc).all()
+
+
+def test_atr(ohlc):
+    high, low, close = ohlc
+    _close(kernels.atr(high, low, close, 14), _atr_ref(high, low, close, 14))
@@ -0,0 +1,89 @@
+"""OpenAI rate-limit header handling in utils.ai_analyzer."""
+import time
+
+import pytest
+
+from utils.ai_analyzer import _parse_duration, _RateLimiter
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("1s", 1.0),
+        ("1.5s", 1.5),
+        ("20ms", 0.02),
+        ("6m0s", 360.0),
+        ("1h2m3s", 3723.0),
+        ("", 0.0),
+        ("soon", 0.0),
+    ],
+)
+def test_parse_duration(value, seconds):
+    assert _parse_duration(value) == pytest.approx(seconds)
+
+
+def _headers(requests="10", tokens="10000", reset_requests="2s", reset_tokens="30s"):
+    return {
+        "x-ratelimit-remaining-requests": requests,
+        "x-ratelimit-remaining-tokens": tokens,
+        "x-ratelimit-reset-requests": reset_requests,
+        "x-ratelimit-reset-tokens": reset_tokens,
+    }
+
+
+def _pause_left(limiter: _RateLimiter) -> float:
+    return limiter._resume_at - time.monotonic()
+
+
+def test_budget_left_does_not_pause():
+    limiter = _RateLimiter()
+    limiter.update(_headers(), tokens_needed=1000)
+    assert _pause_left(limiter) <= 0
+
+
+def test_no_requests_left_pauses_until_request_reset():
+    limiter = _RateLimiter()
+    limiter.update(_headers(requests="0"), tokens_needed=1000)
+    assert 1.5 < _pause_left(limiter) <= 2.0
+
+
+def test_too_few_tokens_pauses_until_token_reset():
+    limiter = _RateLimiter()
+    limiter.update(_headers(tokens="500"), tokens_needed=1000)
+    assert 29.5 < _pause_left(limiter) <= 30.0
+
+
+def test_longest_reset_wins():
+    limiter = _RateLimiter()
+    limiter.update(_headers(requests="0", tokens="0"), tokens_needed=1000)
+    limiter.update(_headers(requests="0", reset_requests="1s"), tokens_needed=1)
+    assert 29.5 < _pause_left(limiter) <= 30.0
+
+
+def test_missing_headers_are_ignored():
+    limiter = _RateLimiter()
+    limiter.update({"x-ratelimit-remaining-requests": "0"}, tokens_needed=1000)
+    limiter.update({}, tokens_needed=1000)
+    assert _pause_left(limiter) <= 0
+
+
+@pytest.mark.asyncio
+async def test_wait_sleeps_out_the_pause():
+    limiter = _RateLimiter()
+    limiter.pause(0.05)
+    start = time.monotonic()
+    await limiter.wait()
+    assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.parametrize("remaining", ["", "n/a", "1.5", "  "])
+def test_malformed_remaining_is_ignored(remaining):
+    limiter = _RateLimiter()
+    limiter.update(_headers(requests=remaining, tokens=remaining), tokens_needed=1000)
+    assert _pause_left(limiter) <= 0
+
+
+def test_malformed_header_does_not_hide_the_other_kind():
+    limiter = _RateLimiter()
+    limiter.update(_headers(requests="junk", tokens="0"), tokens_needed=1000)
+    assert 29.5 < _pause_left(limiter) <= 30.0
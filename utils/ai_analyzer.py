@@ -1,140 +1,420 @@
 """
 AI Chart Analyzer using OpenAI GPT-4 Vision
 """
-import json
 import logging
-import base64
+import mmap
 import asyncio
 import os
-from typing import Union, Dict, Any, Optional
+import random
+import re
+import time
+from functools import lru_cache
+from math import isfinite
+from typing import Union, Dict, Any, List, Optional, Sequence
 from datetime import datetime
+import aiofiles
 import httpx
+import orjson
 from openai import AsyncOpenAI
 
-from utils.image_handler import img_to_base64
+try:
+    from pybase64 import b64encode  # SIMD (AVX2/NEON) encoder
+except ImportError:  # pragma: no cover - pybase64 is optional
+    from base64 import b64encode
+
+from config import CHART_ANALYSIS_PROMPT, get_analyzer_settings
+from utils.image_handler import image_handler
 from bot.utils.data_fetcher import fetch_ohlcv
-from bot.utils.tech_indicators import build_indicator_snapshot
+from bot.utils.tech_indicators import build_indicator_snapshot_async
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# 48 KiB – a multiple of 3, so chunked base64 output needs no re-padding
+_B64_CHUNK = 48 * 1024
+
+# Retry back-off ceilings (s), exponential from 1.5 s; each sleep is jittered
+_BACKOFF = (1.5, 3.0, 6.0, 12.0)
+
+# HTTP statuses that fail the same way on every retry (bad request / key /
+# permissions / model)
+_PERMANENT_STATUSES = frozenset({400, 401, 403, 404})
+
+# Stand-in for the per-request message content in the pre-encoded body
+_CONTENT_SLOT = b'"__CONTENT__"'
+
+
+class OpenAIHTTPError(Exception):
+    """Non-2xx response from the chat completions endpoint."""
+
+    def __init__(self, status_code: int, body: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"OpenAI HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+# "6m0s", "1.5s", "20ms" – OpenAI's x-ratelimit-reset-* duration format
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> float:
+    """Seconds in an OpenAI reset duration string (0.0 if unparsable)."""
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_RE.findall(value))
+
+
+class _RateLimiter:
+    """
+    Holds requests back using OpenAI's ``x-ratelimit-*`` response headers.
+
+    When a response reports that the remaining request or token budget
+    cannot cover another call, later calls wait until the advertised reset
+    instead of bouncing off 429s; a 429's ``Retry-After`` does the same.
+    """
+
+    __slots__ = ('_resume_at',)
+
+    def __init__(self) -> None:
+        self._resume_at = 0.0
+
+    async def wait(self) -> None:
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def update(self, headers: Any, tokens_needed: int) -> None:
+        for kind, needed in (("requests", 1), ("tokens", tokens_needed)):
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            try:
+                remaining = int(headers.get(f"x-ratelimit-remaining-{kind}"))
+            except (ValueError, TypeError):  # absent or malformed – ignore
+                continue
+            if reset is not None and remaining < needed:
+                self.pause(_parse_duration(reset))
+
+# OpenAI / image settings only – validated once; invalid values fail the import
+_settings = get_analyzer_settings()
+
+
+# <symbol>_<tf> file stems, e.g. btcusdt_1h
+_SYMBOL_TF_RE = re.compile(r"(?P<sym>.+)_(?P<tf>1m|5m|15m|30m|1h|4h|1d|1w)")
+
 
-def _detect_symbol_tf(img_path: str) -> tuple[str, str] | None:
+def _detect_symbol_tf(img_path: Union[str, Path]) -> tuple[str, str] | None:
     """
     Quick fallback until OCR is ready.
     ex:  BTCUSDT_1h.png  →  ('BINANCE:BTCUSDT', '1h')
     """
-    stem = Path(img_path).stem.lower()
-    for tf in ("1m","5m","15m","30m","1h","4h","1d","1w"):
-        if stem.endswith(tf):
-            symbol = stem[: -len(tf) - 1]   # remove '_' + tf
-            return f"BINANCE:{symbol.upper()}", tf
-    return None
-
-
-# Chart Analysis Prompt
-CHART_ANALYSIS_PROMPT = """
-You are an expert technical analyst with years of experience in financial markets. 
-Analyze this trading chart image and provide a comprehensive technical analysis.
-
-Look for and analyze:
-1. TREND DIRECTION: Identify the overall trend (uptrend, downtrend, or sideways)
-2. SUPPORT & RESISTANCE: Identify key price levels where price has bounced or been rejected
-3. CHART PATTERNS: Look for classic patterns like triangles, flags, head & shoulders, double tops/bottoms, etc.
-4. VOLUME ANALYSIS: If volume is visible, analyze volume patterns and confirmations
-5. INDICATORS: If technical indicators are visible, interpret their signals
-6. KEY INSIGHTS: Identify the most important observations about this chart
-
-Provide specific price levels when they are clearly visible on the chart.
-Be objective and base your analysis only on what you can see in the chart.
-Consider the timeframe if it's visible.
-
-Format your response as a JSON object with this exact structure:
-{
-  "trend": "uptrend/downtrend/sideways",
-  "confidence": 0.85,
-  "support_levels": [1234.56, 1220.30],
-  "resistance_levels": [1250.00, 1275.80],
-  "patterns": ["ascending triangle", "bullish flag"],
-  "volume_analysis": "Volume analysis description or null if not visible",
-  "indicators": "Technical indicators analysis or null if not visible",
-  "key_insights": "Most important observations about this chart",
-  "risk_level": "low/medium/high",
-  "timeframe_detected": "1m/5m/15m/1h/4h/1d/1w/1M or null if not visible",
-  "market_bias": "bullish/bearish/neutral",
-  "price_targets": [1300.00, 1350.00],
-  "stop_loss_level": 1200.00,
-  "summary": "2-3 sentence summary suitable for sharing"
-}
+    base = os.path.basename(img_path)
+    dot = base.rfind('.')
+    stem = base[:dot] if dot > 0 else base
+    m = _SYMBOL_TF_RE.fullmatch(stem.lower())
+    if m is None:
+        return None
+    return f"BINANCE:{m['sym'].upper()}", m['tf']
 
-Only include price levels that are clearly visible on the chart. 
-If certain information is not visible or unclear, use null for those fields.
-Be conservative in your confidence score - only use high confidence (0.8+) when patterns are very clear.
-"""
 
+@lru_cache(maxsize=1)
+def _iso_stamp(second: int) -> str:
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def _now_iso() -> str:
+    """Local ISO timestamp, formatted at most once per second."""
+    return _iso_stamp(int(time.time()))
+
+
+# Bar length (s) per timeframe – snapshots are reused until the bar closes
+_TF_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800,
+               "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800}
+_SECTION_CACHE_SIZE = 512
+
+# (symbol, tf, bar_start) -> indicator section, oldest entry first
+_SECTION_CACHE: dict[tuple[str, str, int], str] = {}
+# one lock per (symbol, tf) so concurrent requests compute a snapshot once
+_SECTION_LOCKS: dict[tuple[str, str], asyncio.Lock] = {}
 
 
+async def _get_indicator_section(sym: str, tf: str) -> str:
+    """Indicator snapshot for the current *tf* bar, computed once per bar."""
+    bar_len = _TF_SECONDS[tf]
+    key = (sym, tf, int(time.time()) // bar_len * bar_len)
+    async with _SECTION_LOCKS.setdefault((sym, tf), asyncio.Lock()):
+        section = _SECTION_CACHE.get(key)
+        if section is not None:
+            return section
+
+        df = await fetch_ohlcv(sym, tf)            # bot.utils.data_fetcher
+        section = await build_indicator_snapshot_async(df)  # bot.utils.tech_indicators
+        logger.info("📊 Indicators added | %s %s | rows=%d", sym, tf, len(df))
+
+        _SECTION_CACHE[key] = section
+        if len(_SECTION_CACHE) > _SECTION_CACHE_SIZE:
+            del _SECTION_CACHE[next(iter(_SECTION_CACHE))]
+        return section
+
+
+async def _live_indicator_section(img_path: Union[str, Path]) -> str:
+    """Fetch OHLCV for the symbol/tf in the filename and build the snapshot."""
+    symbol_tf = _detect_symbol_tf(img_path)
+    if not symbol_tf:
+        return ""
+    try:
+        return await _get_indicator_section(*symbol_tf)
+    except Exception as e:                    # noqa: BLE001
+        logger.warning("⚠️  Live data unavailable: %s", e)
+        return ""
+
 
 # ------------------------------------------------------------------
 # Live–data prompt helpers  ⬇️  (PUT RIGHT AFTER _detect_symbol_tf)
 # ------------------------------------------------------------------
 PROMPT_TEMPLATE = """
-{analysis_prompt}
-
 ────────────────────────────────────────
 📈 **Live-data snapshot for {symbol} – {tf}**  
 {indicator_context}
 ────────────────────────────────────────
 """
 
-def _build_prompt(chart_b64: str,
+# Text part for the fixed instructions, built once and shared. It always
+# leads the message so OpenAI's prompt cache can reuse the prefix.
+_BASE_TEXT_PART = {"type": "text", "text": CHART_ANALYSIS_PROMPT}
+
+def _build_prompt(image_url: str,
                   indicator_context: str,
                   symbol: str|None,
                   tf: str|None) -> list[dict]:
     """Return a messages list ready for OpenAI (Vision + text)."""
-    analysis_prompt = CHART_ANALYSIS_PROMPT
-    if indicator_context:        # stitch the extra section in
-        analysis_prompt = PROMPT_TEMPLATE.format(
-            analysis_prompt=CHART_ANALYSIS_PROMPT.strip(),
-            symbol=symbol,
-            tf=tf,
-            indicator_context=indicator_context.strip()
-        )
-
     # ① main instructions (+ optional indicator block)
-    msgs = [ {"type":"text", "text": analysis_prompt} ]
+    msgs = [_BASE_TEXT_PART]
+    if indicator_context:        # stitch the extra section in
+        msgs.append({
+            "type": "text",
+            "text": PROMPT_TEMPLATE.format(
+                symbol=symbol,
+                tf=tf,
+                indicator_context=indicator_context.strip(),
+            ),
+        })
 
     # ② the actual image
     msgs.append({
         "type": "image_url",
         "image_url": {
-            "url": f"data:image/jpeg;base64,{chart_b64}",
+            "url": image_url,
             "detail": "high",
         },
     })
     return msgs
 
 
+def _b64_mmap(image_path: Union[str, Path]) -> str:
+    """Base64 of a file read through a read-only memory map."""
+    with open(image_path, 'rb') as image_file:
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return b64encode(mm).decode('ascii')
+
+
+async def _b64_chunked(image_path: Union[str, Path]) -> str:
+    """Base64 of a file read with aiofiles in 3-byte-aligned chunks."""
+    # Chunks are a multiple of 3 bytes, so encoded pieces join with
+    # no padding seams; the output buffer is sized up front.
+    size = os.path.getsize(image_path)
+    buf = bytearray(4 * -(-size // 3))
+    pos = 0
+    async with aiofiles.open(image_path, 'rb') as image_file:
+        while chunk := await image_file.read(_B64_CHUNK):
+            encoded = b64encode(chunk)
+            buf[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+    return buf[:pos].decode('ascii')
+
+
+async def _read_and_encode(image_path: Union[str, Path]) -> str:
+    """Base64 of an image file without blocking the event loop."""
+    cached = image_handler.cached_base64(image_path)
+    if cached is not None:
+        return cached
+    try:
+        # Zero-copy: encode straight from the page cache, off the loop
+        encoded = await asyncio.to_thread(_b64_mmap, image_path)
+    except (OSError, ValueError):
+        # mmap unavailable (or empty file) – stream it instead
+        encoded = await _b64_chunked(image_path)
+    # Encoded once, after validation, so retries and multi-chart requests
+    # reuse it; charts sent by public URL are never encoded at all
+    image_handler.remember_base64(image_path, encoded)
+    return encoded
+
+
+# Charts up to this size are inlined even when a public URL exists – cheaper
+# than OpenAI making a second round trip to fetch them
+_INLINE_MAX_BYTES = 256 * 1024
+
+
+async def _image_url(img_path: Union[str, Path], inline: bool = False) -> str:
+    """
+    URL OpenAI should fetch the chart from.
+
+    With ``IMAGE_PUBLIC_BASE_URL`` set (the API serves the upload folder
+    there) charts over ``_INLINE_MAX_BYTES`` are sent as a plain link and
+    never read here; otherwise, or with *inline*, the image is inlined as a
+    base64 data URI.
+    """
+    base_url = _settings.IMAGE_PUBLIC_BASE_URL
+    if base_url and not inline and os.stat(img_path).st_size > _INLINE_MAX_BYTES:
+        return f"{base_url.rstrip('/')}/{Path(img_path).name}"
+    b64_img = await _read_and_encode(img_path)
+    return f"data:image/jpeg;base64,{b64_img}"
+
+
+# Allowed values for the model's categorical fields
+_VALID_TRENDS = frozenset({'uptrend', 'downtrend', 'sideways'})
+_VALID_BIAS = frozenset({'bullish', 'bearish', 'neutral'})
+_VALID_RISK = frozenset({'low', 'medium', 'high'})
+_LEVEL_KEYS = ('support_levels', 'resistance_levels', 'price_targets')
+_NUMBER_TYPES = (int, float)
+
+
+def _coerce_prices(levels: Any) -> List[float]:
+    """Finite numeric entries of a price-level list as floats; [] for non-lists."""
+    if type(levels) is not list:
+        return []
+    prices = [float(level) for level in levels if type(level) in _NUMBER_TYPES]
+    return [price for price in prices if isfinite(price)]
+
+def _as_text(value: Any) -> Optional[str]:
+    """*value* as a string; None for null/empty."""
+    if value is None or value == '':
+        return None
+    return value if type(value) is str else str(value)
+
+
+def _as_float(value: Any, default: Optional[float]) -> Optional[float]:
+    """Finite *value* as a float, else *default* (null, strings, bools, inf)."""
+    if type(value) not in _NUMBER_TYPES or not isfinite(value):
+        return default
+    return float(value)
+
+
+# Telegram message formatting tables
+_TREND_EMOJI = {
+    'uptrend': '📈',
+    'downtrend': '📉',
+    'sideways': '📊'
+}
+
+_BIAS_EMOJI = {
+    'bullish': '🐂',
+    'bearish': '🐻',
+    'neutral': '⚖️'
+}
+
+_RISK_EMOJI = {
+    'low': '🟢',
+    'medium': '🟡',
+    'high': '🔴'
+}
 
+# Header lines for every valid value, rendered once instead of per message
+_TREND_LINES = {k: f"{e} **Trend:** {k.title()}\n" for k, e in _TREND_EMOJI.items()}
+_BIAS_LINES = {k: f"{e} **Market Bias:** {k.title()}\n" for k, e in _BIAS_EMOJI.items()}
+_RISK_LINES = {k: f"{e} **Risk Level:** {k.title()}\n\n" for k, e in _RISK_EMOJI.items()}
 
+# (field, default, allowed values) for the categorical fields
+_CATEGORICAL_FIELDS = (
+    ('trend', 'sideways', _VALID_TRENDS),
+    ('market_bias', 'neutral', _VALID_BIAS),
+    ('risk_level', 'medium', _VALID_RISK),
+)
+
+_fmt_price = "${:,.2f}".format
+
+_FAILED_TEMPLATE = (
+    "❌ **Analysis Failed**\n\n{}\n\nPlease try again with a different image."
+)
 
 
 class AIAnalyzer:
     """AI-powered chart analysis using GPT-4 Vision"""
+
+    __slots__ = (
+        'api_key', 'client', 'model', 'max_tokens', 'temperature',
+        '_http', '_completions_url', '_headers', '_body_template', '_limiter',
+    )
     
     def __init__(self):
-        self.api_key = os.getenv('OPENAI_API_KEY')
+        self.api_key = _settings.OPENAI_API_KEY
         if not self.api_key or not self.api_key.startswith('sk-'):
             logger.warning("⚠️ No valid OpenAI API key found")
             self.client = None
+            self._http = None
         else:
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            # One keep-alive HTTP/2 pool for every analysis in this process –
+            # ``ai_analyzer`` is the process-wide singleton that owns it
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=40,
+                    max_connections=100,
+                    keepalive_expiry=30.0,
+                ),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+            self.client = AsyncOpenAI(api_key=self.api_key, http_client=self._http)
+            self._completions_url = f"{str(self.client.base_url).rstrip('/')}/chat/completions"
+            self._headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            }
             logger.info("✅ OpenAI client initialized")
         
-        self.model = "gpt-4o"
-        self.max_tokens = 1000
-        self.temperature = 0.1
+        self.model = _settings.OPENAI_MODEL
+        self.max_tokens = _settings.OPENAI_MAX_TOKENS
+        self.temperature = _settings.OPENAI_TEMPERATURE
+
+        self._limiter = _RateLimiter()
+
+        # Request body with everything but the message content pre-encoded
+        self._body_template = orjson.dumps({
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "response_format": {"type": "json_object"},
+            "messages": [{"role": "user", "content": "__CONTENT__"}],
+        })
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP pool (call once on shutdown)."""
+        if self._http is not None:
+            await self._http.aclose()
+
+    async def _post_completion(self, content: Union[str, list]) -> Dict[str, Any]:
+        """
+        POST one chat completion straight through the shared httpx pool.
+
+        Skips the SDK's request/response models: only *content* is encoded
+        per call, and the JSON reply is returned as a plain dict.
+        """
+        body = self._body_template.replace(_CONTENT_SLOT, orjson.dumps(content), 1)
+        await self._limiter.wait()
+        resp = await self._http.post(self._completions_url, content=body, headers=self._headers)
+        self._limiter.update(resp.headers, self.max_tokens)
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.headers.get("retry-after", ""))
+            except ValueError:  # absent, or an HTTP date
+                retry_after = None
+            else:
+                self._limiter.pause(retry_after)
+            raise OpenAIHTTPError(resp.status_code, resp.text, retry_after)
+        if resp.status_code >= 400:
+            raise OpenAIHTTPError(resp.status_code, resp.text)
+        return orjson.loads(resp.content)
         
 
          # ──────────────────────────────────────────────────────────────
@@ -146,86 +426,212 @@ class AIAnalyzer:
         """
         Main entry point the bot calls.
 
-        * Validates / base64-encodes the image.
+        * Resolves the image URL (public link, or base64 data URI).
         * (Optionally) fetches live OHLCV & indicator snapshot.
         * Builds the prompt and calls OpenAI with retry & back-off.
-        * Returns a dict  {success, content, usage}
+        * Returns a dict  {success, content, usage, processing_time}
         """
+        if self.client is None:
+            return self._get_no_api_key_response()  # nothing to retry
+
         img_path = Path(img_path)
-        start_time = datetime.now()
-        base_delay = 1.5  # s  exponential back-off
-
-        # 1)  image → base64
-        with img_path.open("rb") as f:
-            b64_img = base64.b64encode(f.read()).decode()
-
-        # 2)  attach live market context (non-fatal)
-        symbol_tf = _detect_symbol_tf(img_path)
-        indicator_section = ""
-        if symbol_tf:
-            sym, tf = symbol_tf
-            try:
-                df = fetch_ohlcv(sym, tf)            # bot.utils.data_fetcher
-                indicator_section = build_indicator_snapshot(df)  # bot.utils.tech_indicators
-                logger.info("📊 Indicators added | %s %s | rows=%d", sym, tf, len(df))
-            except Exception as e:                    # noqa: BLE001
-                logger.warning("⚠️  Live data unavailable: %s", e)
-
-        # 3)  build the prompt
-        prompt = PROMPT_TEMPLATE.format(
-            chart_b64=b64_img,
-            indicator_context=indicator_section or "No live data available.",
+        start_time = time.perf_counter()
+
+        # 1+2)  image URL and live market context (non-fatal), overlapped
+        image_url, indicator_section = await asyncio.gather(
+            _image_url(img_path),
+            _live_indicator_section(img_path),
         )
 
+        # 3)  build the prompt – the image travels in the image_url part
+        sym, tf = _detect_symbol_tf(img_path) or (None, None)
+        content = _build_prompt(image_url, indicator_section, sym, tf)
+
         # 4)  call OpenAI with retries
         for attempt in range(max_retries):
             try:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    response_format={"type": "json_object"},
-                )
-                logger.info("✅ OpenAI completed in %.2fs", (datetime.now() - start_time).total_seconds())
+                response = await self._post_completion(content)
+                elapsed = time.perf_counter() - start_time
+                logger.info("✅ OpenAI completed in %.2fs", elapsed)
                 return {
                     "success": True,
-                    "content": response.choices[0].message.content,
-                    "usage": response.usage.model_dump() if response.usage else None,
+                    "content": response["choices"][0]["message"]["content"],
+                    "usage": response.get("usage"),
+                    "processing_time": elapsed,
                 }
 
             except Exception as e:
+                if isinstance(e, OpenAIHTTPError) and e.status_code in _PERMANENT_STATUSES:
+                    raise  # bad key / bad request – retrying cannot succeed
                 logger.warning("⏳ OpenAI attempt %d failed: %s", attempt + 1, e)
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(base_delay * (2 ** attempt))
-                else:
+                if attempt == max_retries - 1:
                     raise
+                if getattr(e, "retry_after", None) is None:
+                    delay = _BACKOFF[min(attempt, len(_BACKOFF) - 1)]
+                    await asyncio.sleep(random.uniform(0, delay))  # full jitter
+                # else: the limiter already holds the retry until Retry-After
+
+    async def analyze_charts(
+        self,
+        img_paths: Sequence[Union[str, Path]],
+        max_concurrency: int = 8,
+    ) -> List[Union[dict, BaseException]]:
+        """
+        Analyze several charts concurrently (e.g. a forwarded album).
+
+        At most *max_concurrency* OpenAI calls are in flight at once.
+        Results keep the order of *img_paths*; a chart that failed is
+        returned as its exception instead of aborting the others.
+        """
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def _one(img_path: Union[str, Path]) -> dict:
+            async with sem:
+                return await self.analyze_chart(img_path)
+
+        return await asyncio.gather(
+            *(_one(p) for p in img_paths), return_exceptions=True
+        )
+
+    async def analyze_multi_tf(
+        self,
+        img_paths: Sequence[Union[str, Path]],
+        max_concurrency: int = 20,
+    ) -> Dict[str, Union[dict, BaseException]]:
+        """
+        Analyze one symbol's charts on several timeframes (1h + 4h + 1d …)
+        at once instead of one after another.
+
+        Returns ``{tf: result}``, using the timeframe from each file name
+        (the path itself when none is found); failures are returned as
+        their exception.
+        """
+        results = await self.analyze_charts(img_paths, max_concurrency)
+        keyed: Dict[str, Union[dict, BaseException]] = {}
+        for img_path, result in zip(img_paths, results):
+            symbol_tf = _detect_symbol_tf(img_path)
+            keyed[symbol_tf[1] if symbol_tf else str(img_path)] = result
+        return keyed
+   
+    
+    async def submit_batch(self, img_paths: Sequence[Union[str, Path]]) -> str:
+        """
+        Queue charts on the OpenAI Batch API for non-interactive jobs.
+
+        Batch jobs cost half as much and draw on a separate rate-limit pool,
+        but finish within 24 h, so images are always inlined (uploads are
+        cleaned up long before that). Each line's ``custom_id`` is the
+        image path; repeated paths are submitted once, since the Batch API
+        rejects duplicate ids. Returns the batch id for :meth:`wait_for_batch`.
+        """
+        if self.client is None:
+            raise RuntimeError("OpenAI API key not configured")
+
+        async def _line(img_path: Union[str, Path]) -> bytes:
+            image_url, indicator_section = await asyncio.gather(
+                _image_url(img_path, inline=True),
+                _live_indicator_section(img_path),
+            )
+            sym, tf = _detect_symbol_tf(img_path) or (None, None)
+            return orjson.dumps({
+                "custom_id": str(img_path),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "max_tokens": self.max_tokens,
+                    "temperature": self.temperature,
+                    "response_format": {"type": "json_object"},
+                    "messages": [{
+                        "role": "user",
+                        "content": _build_prompt(image_url, indicator_section, sym, tf),
+                    }],
+                },
+            })
+
+        unique_paths = dict.fromkeys(str(p) for p in img_paths)
+        lines = await asyncio.gather(*(_line(p) for p in unique_paths))
+        batch_file = await self.client.files.create(
+            file=("charts.jsonl", b"\n".join(lines)),
+            purpose="batch",
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info("📦 Batch %s submitted with %d charts", batch.id, len(lines))
+        return batch.id
+
+    async def wait_for_batch(
+        self,
+        batch_id: str,
+        poll_interval: float = 60.0,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Poll a batch from :meth:`submit_batch` until it finishes.
+
+        Returns ``{custom_id: analysis}`` where each analysis went through
+        the same validation as an interactive one.
+        """
+        if self.client is None:
+            raise RuntimeError("OpenAI API key not configured")
+
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                break
+            await asyncio.sleep(poll_interval)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch_id} ended with status {batch.status}")
+
+        output = await self.client.files.content(batch.output_file_id)
+        results: Dict[str, Dict[str, Any]] = {}
+        for raw in output.content.splitlines():
+            if not raw:
+                continue
+            line = orjson.loads(raw)
+            response = line.get("response") or {}
+            if response.get("status_code") != 200:
+                results[line["custom_id"]] = self._get_error_response(
+                    str(line.get("error") or response.get("body"))
+                )
+                continue
+            body = response["body"]
+            results[line["custom_id"]] = await self.process_analysis_result({
+                "success": True,
+                "content": body["choices"][0]["message"]["content"],
+                "usage": body.get("usage"),
+            })
+        return results
    
     
     async def _prepare_image(self, image_path: str) -> Optional[str]:
         """Prepare image for OpenAI API by encoding to base64"""
         try:
-            with open(image_path, 'rb') as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            base64_image = await _read_and_encode(image_path)
                 
-            logger.info(f"✅ Image prepared for analysis: {len(base64_image)} chars")
+            logger.debug("✅ Image prepared for analysis: %d chars", len(base64_image))
             return base64_image
             
         except Exception as e:
-            logger.error(f"❌ Error preparing image: {str(e)}")
+            logger.error("❌ Error preparing image: %s", e)
             return None
     
     
 
-    async def _process_analysis_result(self, api_result: Dict[str, Any]) -> Dict[str, Any]:
+    async def process_analysis_result(self, api_result: Dict[str, Any]) -> Dict[str, Any]:
         """Process and validate OpenAI API response"""
+        if 'content' not in api_result:
+            return api_result  # already an analysis (e.g. the no-key response)
         try:
             if not api_result.get('success'):
                 raise ValueError("API call failed")
             
             # Parse JSON response
             content = api_result.get('content', '{}')
-            analysis_data = json.loads(content)
+            analysis_data = orjson.loads(content)
             
             # Validate and normalize data
             analysis_data = self._validate_analysis_data(analysis_data)
@@ -233,67 +639,56 @@ class AIAnalyzer:
             # Add metadata
             analysis_data['success'] = True
             analysis_data['api_usage'] = api_result.get('usage')
-            analysis_data['generated_at'] = datetime.now().isoformat()
+            analysis_data['processing_time'] = api_result.get('processing_time')
+            analysis_data['generated_at'] = _now_iso()
             
             return analysis_data
             
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to parse JSON response: {str(e)}")
+        except orjson.JSONDecodeError as e:
+            logger.error("❌ Failed to parse JSON response: %s", e)
             return self._get_error_response(f"Invalid JSON response: {str(e)}")
         except Exception as e:
-            logger.error(f"❌ Error processing analysis result: {str(e)}")
+            logger.error("❌ Error processing analysis result: %s", e)
             return self._get_error_response(str(e))
     
-    def _validate_analysis_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _validate_analysis_data(data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and normalize analysis data"""
         # Set defaults for required fields
+        # The model may send null (or a non-string) for any field – fall back
+        # to the defaults so the formatter always sees strings
         validated = {
-            'trend': data.get('trend', 'sideways').lower(),
-            'confidence': float(data.get('confidence', 0.5)),
-            'market_bias': data.get('market_bias', 'neutral').lower(),
-            'risk_level': data.get('risk_level', 'medium').lower(),
-            'support_levels': [],
-            'resistance_levels': [],
-            'price_targets': [],
-            'patterns': [],
-            'volume_analysis': data.get('volume_analysis'),
+            'confidence': _as_float(data.get('confidence'), 0.5),
+            'volume_analysis': _as_text(data.get('volume_analysis')),
             'indicators': data.get('indicators'),
-            'key_insights': data.get('key_insights', 'Analysis completed.'),
-            'timeframe_detected': data.get('timeframe_detected'),
-            'stop_loss_level': data.get('stop_loss_level'),
-            'summary': data.get('summary', 'Chart analysis completed.')
+            'key_insights': _as_text(data.get('key_insights')) or 'Analysis completed.',
+            'timeframe_detected': _as_text(data.get('timeframe_detected')),
+            'stop_loss_level': _as_float(data.get('stop_loss_level'), None),
+            'summary': _as_text(data.get('summary')) or 'Chart analysis completed.'
         }
         
-        # Validate trend
-        if validated['trend'] not in ['uptrend', 'downtrend', 'sideways']:
-            validated['trend'] = 'sideways'
+        # Validate trend / market bias / risk level against their allowed values
+        for key, default, allowed in _CATEGORICAL_FIELDS:
+            value = (_as_text(data.get(key)) or default).lower()
+            validated[key] = value if value in allowed else default
         
         # Validate confidence
         if not 0 <= validated['confidence'] <= 1:
             validated['confidence'] = 0.5
         
         # Validate price levels
-        for level_key in ['support_levels', 'resistance_levels', 'price_targets']:
-            levels = data.get(level_key, [])
-            if isinstance(levels, list):
-                validated[level_key] = [float(level) for level in levels if isinstance(level, (int, float))]
+        validated.update({key: _coerce_prices(data.get(key)) for key in _LEVEL_KEYS})
         
         # Validate patterns
         patterns = data.get('patterns', [])
-        if isinstance(patterns, list):
-            validated['patterns'] = [str(pattern) for pattern in patterns if pattern]
-        
-        # Validate risk level
-        if validated['risk_level'] not in ['low', 'medium', 'high']:
-            validated['risk_level'] = 'medium'
-        
-        # Validate market bias
-        if validated['market_bias'] not in ['bullish', 'bearish', 'neutral']:
-            validated['market_bias'] = 'neutral'
+        validated['patterns'] = (
+            [str(pattern) for pattern in patterns if pattern] if type(patterns) is list else []
+        )
         
         return validated
     
-    def _get_error_response(self, error_message: str, processing_time: float = 0) -> Dict[str, Any]:
+    @staticmethod
+    def _get_error_response(error_message: str, processing_time: float = 0) -> Dict[str, Any]:
         """Get standardized error response"""
         return {
             'success': False,
@@ -313,10 +708,11 @@ class AIAnalyzer:
             'stop_loss_level': None,
             'summary': 'Analysis could not be completed.',
             'processing_time': processing_time,
-            'generated_at': datetime.now().isoformat()
+            'generated_at': _now_iso()
         }
     
-    def _get_no_api_key_response(self) -> Dict[str, Any]:
+    @staticmethod
+    def _get_no_api_key_response() -> Dict[str, Any]:
         """Get response when no API key is available"""
         return {
             'success': False,
@@ -336,32 +732,14 @@ class AIAnalyzer:
             'stop_loss_level': 41500.0,
             'summary': 'Demo analysis showing bullish trend. Configure OpenAI API key for real analysis.',
             'processing_time': 1.5,
-            'generated_at': datetime.now().isoformat()
+            'generated_at': _now_iso()
         }
     
-    def format_analysis_message(self, analysis: Dict[str, Any]) -> str:
+    @staticmethod
+    def format_analysis_message(analysis: Dict[str, Any]) -> str:
         """Format analysis result for Telegram message"""
         if not analysis.get('success', True):
-            return f"❌ **Analysis Failed**\n\n{analysis.get('error', 'Unknown error')}\n\nPlease try again with a different image."
-        
-        # Emoji mapping
-        trend_emoji = {
-            'uptrend': '📈',
-            'downtrend': '📉',
-            'sideways': '📊'
-        }
-        
-        bias_emoji = {
-            'bullish': '🐂',
-            'bearish': '🐻',
-            'neutral': '⚖️'
-        }
-        
-        risk_emoji = {
-            'low': '🟢',
-            'medium': '🟡',
-            'high': '🔴'
-        }
+            return _FAILED_TEMPLATE.format(analysis.get('error', 'Unknown error'))
         
         # Build message
         trend = analysis.get('trend', 'sideways')
@@ -369,71 +747,69 @@ class AIAnalyzer:
         market_bias = analysis.get('market_bias', 'neutral')
         risk_level = analysis.get('risk_level', 'medium')
         
-        message = f"📊 **Chart Analysis Results**\n\n"
+        parts = ["📊 **Chart Analysis Results**\n\n"]
+        append = parts.append
         
         # Main analysis
-        message += f"{trend_emoji.get(trend, '📊')} **Trend:** {trend.title()}\n"
-        message += f"{bias_emoji.get(market_bias, '⚖️')} **Market Bias:** {market_bias.title()}\n"
-        message += f"🎯 **Confidence:** {confidence:.0%}\n"
-        message += f"{risk_emoji.get(risk_level, '🟡')} **Risk Level:** {risk_level.title()}\n\n"
+        append(_TREND_LINES.get(trend) or f"📊 **Trend:** {trend.title()}\n")
+        append(_BIAS_LINES.get(market_bias) or f"⚖️ **Market Bias:** {market_bias.title()}\n")
+        append(f"🎯 **Confidence:** {confidence:.0%}\n")
+        append(_RISK_LINES.get(risk_level) or f"🟡 **Risk Level:** {risk_level.title()}\n\n")
         
         # Price levels
         support_levels = analysis.get('support_levels', [])
         resistance_levels = analysis.get('resistance_levels', [])
         
         if support_levels:
-            levels_text = ', '.join([f"${level:,.2f}" for level in support_levels[:3]])
-            message += f"🟢 **Support:** {levels_text}\n"
+            append(f"🟢 **Support:** {', '.join(map(_fmt_price, support_levels[:3]))}\n")
         
         if resistance_levels:
-            levels_text = ', '.join([f"${level:,.2f}" for level in resistance_levels[:3]])
-            message += f"🔴 **Resistance:** {levels_text}\n"
+            append(f"🔴 **Resistance:** {', '.join(map(_fmt_price, resistance_levels[:3]))}\n")
         
         # Patterns
         patterns = analysis.get('patterns', [])
         if patterns:
-            message += f"📐 **Patterns:** {', '.join(patterns[:3])}\n"
+            append(f"📐 **Patterns:** {', '.join(patterns[:3])}\n")
         
         # Targets and stop loss
         price_targets = analysis.get('price_targets', [])
         stop_loss = analysis.get('stop_loss_level')
         
         if price_targets:
-            targets_text = ', '.join([f"${target:,.2f}" for target in price_targets[:2]])
-            message += f"🎯 **Targets:** {targets_text}\n"
+            append(f"🎯 **Targets:** {', '.join(map(_fmt_price, price_targets[:2]))}\n")
         
         if stop_loss:
-            message += f"🛑 **Stop Loss:** ${stop_loss:,.2f}\n"
+            append(f"🛑 **Stop Loss:** {_fmt_price(stop_loss)}\n")
         
         # Timeframe
         timeframe = analysis.get('timeframe_detected')
         if timeframe:
-            message += f"⏱️ **Timeframe:** {timeframe.upper()}\n"
+            append(f"⏱️ **Timeframe:** {timeframe.upper()}\n")
         
-        message += "\n"
+        append("\n")
         
         # Key insights
         key_insights = analysis.get('key_insights')
         if key_insights:
-            message += f"💡 **Key Insights:**\n{key_insights}\n\n"
+            append(f"💡 **Key Insights:**\n{key_insights}\n\n")
         
         # Summary
         summary = analysis.get('summary', 'Analysis completed.')
-        message += f"📝 **Summary:**\n{summary}\n\n"
+        append(f"📝 **Summary:**\n{summary}\n\n")
         
         # Processing time
         processing_time = analysis.get('processing_time')
         if processing_time:
-            message += f"⚡ *Analysis completed in {processing_time:.1f}s*\n"
+            append(f"⚡ *Analysis completed in {processing_time:.1f}s*\n")
         
         # API key status
-        if 'demo' in analysis.get('key_insights', '').lower():
-            message += "\n🔧 *Add OpenAI API key for real analysis*\n"
+        if 'demo' in (analysis.get('key_insights') or '').lower():
+            append("\n🔧 *Add OpenAI API key for real analysis*\n")
         
         # Disclaimer
-        message += "\n⚠️ *This analysis is for educational purposes only.*"
+        append("\n⚠️ *This analysis is for educational purposes only.*")
         
-        return message
+        return "".join(parts)
 
 # Create singleton instance
 ai_analyzer = AIAnalyzer()
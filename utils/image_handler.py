@@ -6,37 +6,245 @@ Handles image download, validation, processing, and cleanup
 from __future__ import annotations
 
 import asyncio
-import base64
+import heapq
 import logging
 import os
+import struct
+import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import aiofiles
+import numpy as np
 from PIL import Image
 
+try:
+    import pybase64 as base64  # SIMD (AVX2/NEON) encoder, same API
+except ImportError:  # pragma: no cover - pybase64 is optional
+    import base64
+
+try:
+    import pyvips
+except (ImportError, OSError):  # pragma: no cover - libvips is optional
+    pyvips = None
+
+try:
+    from turbojpeg import TJPF_RGB, TurboJPEG
+    _turbo = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # pragma: no cover - optional
+    _turbo = None
+
 logger = logging.getLogger(__name__)
 
+# GPT-4o "high" detail scales images to fit 2048×2048, then shortest side 768;
+# anything larger is downscaled here so we never upload pixels it discards
+_VISION_MAX_SIDE = 2048
+_VISION_SHORT_SIDE = 768
+
+# Minimum seconds between two cleanup sweeps
+_SWEEP_INTERVAL = 5.0
+
+# Concurrent decode/resize jobs (the bot container has < 1 CPU and 600 MB)
+_RESIZE_CONCURRENCY = 2
+
+# Worker threads cleanup_old_files spreads its unlinks over
+_CLEANUP_WORKERS = 8
+
+# Upper bound on base64 kept for live charts (see ImageHandler.cached_base64)
+_B64_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _vision_scale(w: int, h: int) -> float:
+    """Factor (≤ 1) that fits *w*×*h* into GPT-4o's high-detail size."""
+    return min(1.0, _VISION_MAX_SIDE / max(w, h), _VISION_SHORT_SIDE / min(w, h))
+
+
+def _fit_for_vision(p: Path, w: int, h: int) -> None:
+    """Downscale *p* in place to GPT-4o's high-detail size (blocking)."""
+    scale = _vision_scale(w, h)
+    jpeg = p.suffix.lower() in (".jpg", ".jpeg")
+
+    if pyvips is not None:
+        # SIMD resampling + libjpeg-turbo; thumbnail() streams the source
+        try:
+            img = pyvips.Image.thumbnail(
+                str(p), round(w * scale), height=round(h * scale), size="down"
+            )
+            if jpeg:
+                data = img.jpegsave_buffer(Q=85, optimize_coding=True)
+            else:
+                data = img.pngsave_buffer()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("⚠️ pyvips resize failed for %s, using Pillow: %s", p.name, exc)
+        else:
+            p.write_bytes(data)
+            return
+
+    size = (round(w * scale), round(h * scale))
+
+    if _turbo is not None and jpeg:
+        # libjpeg-turbo decodes at 1/2, 1/4 or 1/8 scale in the IDCT itself,
+        # so LANCZOS only finishes the last (≤ 2×) step
+        denom = 1
+        while denom < 8 and scale * denom * 2 <= 1.0:
+            denom *= 2
+        try:
+            pixels = _turbo.decode(p.read_bytes(), pixel_format=TJPF_RGB, scaling_factor=(1, denom))
+            im = Image.fromarray(pixels).resize(size, Image.Resampling.LANCZOS)
+            data = _turbo.encode(np.asarray(im), quality=85, pixel_format=TJPF_RGB)
+        except Exception as exc:  # noqa: BLE001
+            # e.g. CMYK/YCCK JPEGs that TJPF_RGB cannot decode
+            logger.warning("⚠️ turbojpeg resize failed for %s, using Pillow: %s", p.name, exc)
+        else:
+            p.write_bytes(data)
+            return
+
+    with Image.open(p) as im:
+        if jpeg:
+            # libjpeg scaled IDCT: decode straight to the closest 1/2ⁿ size
+            # that still covers *size*, leaving LANCZOS only the remainder
+            im.draft("RGB", size)
+        # reducing_gap: box-reduce to ~2× target first, LANCZOS the rest
+        im.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        if jpeg:
+            # baseline 4:2:0 – libjpeg-turbo's fastest encode path
+            im.save(p, optimize=True, quality=85, progressive=False, subsampling=2)
+        else:
+            im.save(p, optimize=True)
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# SOFn markers carry the frame size; C4/C8/CC share the range but do not
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_JPEG_STANDALONE = frozenset(range(0xD0, 0xD9)) | {0x01}
+
+
+def _peek_jpeg_size(fh) -> Optional[Tuple[int, int]]:
+    """Walk JPEG marker segments up to the first SOFn; ``(w, h)`` or None."""
+    if fh.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        if fh.read(1) != b"\xff":
+            return None
+        marker = fh.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = fh.read(1)
+        if not marker:
+            return None
+        if marker[0] in _JPEG_STANDALONE:
+            continue
+        header = fh.read(2)
+        if len(header) < 2:
+            return None
+        (length,) = struct.unpack(">H", header)
+        if marker[0] in _JPEG_SOF:
+            frame = fh.read(5)
+            if len(frame) < 5:
+                return None
+            _, h, w = struct.unpack(">BHH", frame)
+            return (w, h) if h else None  # h == 0: height given later (DNL)
+        fh.seek(length - 2, os.SEEK_CUR)
+
+
+def _peek_image_size(path: os.PathLike | str) -> Optional[Tuple[int, int]]:
+    """
+    Image dimensions read from the PNG IHDR / JPEG SOF header without
+    building a Pillow decoder; None when the header cannot be parsed.
+    """
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(24)
+            if head[:8] == _PNG_SIGNATURE and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            fh.seek(0)
+            return _peek_jpeg_size(fh)
+    except (OSError, struct.error):
+        return None
+
+
+def _inspect_and_fit(p: Path) -> Tuple[int, int, bool]:
+    """PIL header check, then downscale if needed; returns ``(w, h, resized)``."""
+    with Image.open(p) as im:
+        w, h = im.size
+    if w < 100 or h < 100 or _vision_scale(w, h) >= 1.0:
+        return w, h, False
+    _fit_for_vision(p, w, h)
+    return w, h, True
+
+
+def _unlink_batch(paths: List[os.PathLike | str]) -> int:
+    """Delete *paths* (blocking); returns how many files were removed."""
+    removed = 0
+    for path in paths:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.error("❌ Error deleting %s: %s", path, exc)
+    return removed
+
+
+def _list_charts(folder: Path) -> List[str]:
+    """Paths of every ``chart_*`` file in *folder* (blocking)."""
+    # DirEntry.is_file() uses the type from the directory read – no stat
+    with os.scandir(folder) as entries:
+        return [e.path for e in entries if e.name.startswith("chart_") and e.is_file()]
+
 
 class ImageHandler:
     """Handles image operations for chart analysis."""
 
+    allowed_extensions = frozenset({".png", ".jpg", ".jpeg"})
+
     def __init__(self) -> None:
         # Where downloaded chart images are stored
         self.upload_folder = Path(os.getenv("UPLOAD_FOLDER", "/app/uploads"))
 
         # 5 MB default size cap (can override via env)
         self.max_file_size = int(os.getenv("MAX_FILE_SIZE", "5242880"))
+        self._max_mb = self.max_file_size / 1_048_576
 
         # seconds before image auto-deletion
         self.cleanup_delay = int(os.getenv("IMAGE_RETENTION_SECONDS", "60"))
 
-        self.allowed_extensions = {".png", ".jpg", ".jpeg"}
+        # (expires_at, path) min-heap drained by a single janitor task
+        self._expiry: List[Tuple[float, Path]] = []
+        self._janitor_task: Optional[asyncio.Task] = None
+        # path -> holders; the janitor postpones these instead of deleting
+        self._in_use: Dict[Path, int] = {}
+
+        # Resizes in flight at once – each holds a decoded bitmap in memory
+        self._resize_sem = asyncio.Semaphore(_RESIZE_CONCURRENCY)
+
+        # path -> base64 of the validated file, oldest first
+        self._b64_cache: Dict[str, str] = {}
+        self._b64_cache_bytes = 0
 
         # Ensure upload dir exists
         self.upload_folder.mkdir(parents=True, exist_ok=True)
         logger.info("📁 Image handler initialized – Upload folder: %s", self.upload_folder)
 
+    def cached_base64(self, file_path: os.PathLike | str) -> Optional[str]:
+        """Base64 remembered for *file_path*, if it is unchanged since."""
+        return self._b64_cache.get(os.fspath(file_path))
+
+    def remember_base64(self, file_path: os.PathLike | str, encoded: str) -> None:
+        """Keep *encoded* until the file is resized or deleted."""
+        self._forget_base64(file_path)
+        self._b64_cache[os.fspath(file_path)] = encoded
+        self._b64_cache_bytes += len(encoded)
+        while self._b64_cache_bytes > _B64_CACHE_MAX_BYTES:
+            self._forget_base64(next(iter(self._b64_cache)))
+
+    def _forget_base64(self, file_path: os.PathLike | str) -> None:
+        encoded = self._b64_cache.pop(os.fspath(file_path), None)
+        if encoded is not None:
+            self._b64_cache_bytes -= len(encoded)
+
     # ------------------------------------------------------------------ #
     # Telegram download / validation                                     #
     # ------------------------------------------------------------------ #
@@ -57,26 +265,30 @@ class ImageHandler:
             Absolute path to the stored file, or *None* on failure.
         """
         try:
-            file_id = uuid.uuid4().hex
+            # 22-char base64 id; "-~" alphabet keeps "_" out of the stem so
+            # it cannot read as a <symbol>_<tf> name
+            file_id = base64.b64encode(uuid.uuid4().bytes, altchars=b"-~")[:22].decode("ascii")
             filename = f"chart_{file_id}.{file_extension.lower()}"
             file_path = self.upload_folder / filename
 
             logger.info("📥 Downloading image: %s", filename)
-            await telegram_file.download_to_drive(str(file_path))
+            # Fetch into memory, then write without blocking the loop
+            # (download_to_drive writes the file synchronously)
+            buf = await telegram_file.download_as_bytearray()
 
-            # Verify something was actually written
-            if not file_path.exists() or file_path.stat().st_size == 0:
+            # Verify something was actually received
+            size_bytes = len(buf)
+            if size_bytes == 0:
                 logger.error("❌ Download failed: %s", filename)
                 return None
 
-            logger.info(
-                "✅ Downloaded successfully: %s (%d bytes)",
-                filename,
-                file_path.stat().st_size,
-            )
+            async with aiofiles.open(file_path, "wb") as fh:
+                await fh.write(buf)
+
+            logger.info("✅ Downloaded successfully: %s (%d bytes)", filename, size_bytes)
 
             # Schedule automatic removal
-            asyncio.create_task(self._schedule_cleanup(file_path))
+            self._schedule_cleanup(file_path)
             return str(file_path)
 
         except Exception as exc:  # noqa: BLE001
@@ -87,48 +299,55 @@ class ImageHandler:
         """
         Full validation pipeline used by the *bot* before passing the chart
         to OpenAI. Performs size checks, basic dimension checks, and rescales
-        ultra-large pictures down to ≤ 2048 px.
+        pictures down to GPT-4o's high-detail size (≤ 2048 px, short side
+        ≤ 768 px).
 
         Returns:
             ``(is_valid, reason_or_info)``
         """
         try:
-            p = Path(file_path)
-
-            if not p.exists():
+            try:
+                size_bytes = os.stat(file_path).st_size
+            except FileNotFoundError:
                 return False, "Image file not found"
 
-            size_bytes = p.stat().st_size
             if size_bytes > self.max_file_size:
                 return (
                     False,
                     f"Image too large: {size_bytes/1_048_576:.1f} MB "
-                    f"(max {self.max_file_size/1_048_576:.1f} MB)",
+                    f"(max {self._max_mb:.1f} MB)",
                 )
             if size_bytes < 1024:  # < 1 KB
                 return False, "Image file too small"
 
-            if p.suffix.lower() not in self.allowed_extensions:
-                return False, f"Unsupported format: {p.suffix}"
-
-            # Basic PIL verification + optional down-scale
-            try:
-                with Image.open(p) as im:
-                    w, h = im.size
-                    if w < 100 or h < 100:
-                        return False, "Image too small (minimum 100×100 px)"
-
-                    if w > 4096 or h > 4096:
-                        logger.info("🔧 Resizing large image: %dx%d", w, h)
-                        im.thumbnail((2048, 2048), Image.Resampling.LANCZOS)
-                        im.save(p, optimize=True, quality=85)
-                        logger.info("✅ Image resized and optimized")
-
-                    logger.info("✅ Image validated: %dx%d, %d bytes", w, h, size_bytes)
-                    return True, f"Valid image: {w}×{h}px"
-
-            except Exception as pil_error:  # noqa: BLE001
-                return False, f"Invalid image file: {pil_error}"
+            suffix = os.path.splitext(file_path)[1]
+            if suffix.lower() not in self.allowed_extensions:
+                return False, f"Unsupported format: {suffix}"
+
+            # Header probe first: charts within the high-detail size or too
+            # small never reach Pillow. Otherwise PIL verification + down-scale
+            # in a worker thread (pyvips, turbojpeg and Pillow release the GIL)
+            dims = _peek_image_size(file_path)
+            if dims is not None and (min(dims) < 100 or _vision_scale(*dims) >= 1.0):
+                (w, h), resized = dims, False
+            else:
+                try:
+                    async with self._resize_sem:
+                        w, h, resized = await asyncio.to_thread(
+                            _inspect_and_fit, Path(file_path)
+                        )
+                except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as pil_error:
+                    # Pillow's decode failures; anything else is an internal error
+                    return False, f"Invalid image file: {pil_error}"
+
+            if w < 100 or h < 100:
+                return False, "Image too small (minimum 100×100 px)"
+            if resized:
+                self._forget_base64(file_path)
+                logger.info("✅ Image resized and optimized: %dx%d", w, h)
+
+            logger.info("✅ Image validated: %dx%d, %d bytes", w, h, size_bytes)
+            return True, f"Valid image: {w}×{h}px"
 
         except Exception as exc:  # noqa: BLE001
             logger.error("❌ Error validating image: %s", exc)
@@ -138,72 +357,85 @@ class ImageHandler:
     # Cleanup helpers                                                    #
     # ------------------------------------------------------------------ #
 
-    async def _schedule_cleanup(self, file_path: Path) -> None:
-        """Remove *file_path* after ``self.cleanup_delay`` seconds."""
+    @contextmanager
+    def in_use(self, file_path: os.PathLike | str) -> Iterator[None]:
+        """
+        Keep *file_path* on disk while the block runs. An expiry that falls
+        inside it is pushed back by ``self.cleanup_delay``, so a chart
+        queued for analysis (or fetched by URL on a retry) outlives it.
+        """
+        path = Path(file_path)
+        self._in_use[path] = self._in_use.get(path, 0) + 1
         try:
-            logger.info("⏰ Scheduled cleanup for %s in %ds", file_path.name, self.cleanup_delay)
-            await asyncio.sleep(self.cleanup_delay)
-            await self._cleanup_file(file_path)
-        except Exception as exc:  # noqa: BLE001
-            logger.error("❌ Error in cleanup scheduler: %s", exc)
-
-    async def _cleanup_file(self, file_path: Path) -> None:
-        """Delete a single file if it still exists."""
+            yield
+        finally:
+            if self._in_use[path] == 1:
+                del self._in_use[path]
+            else:
+                self._in_use[path] -= 1
+
+    def _schedule_cleanup(self, file_path: Path) -> None:
+        """Queue *file_path* for removal after ``self.cleanup_delay`` seconds."""
+        heapq.heappush(self._expiry, (time.monotonic() + self.cleanup_delay, file_path))
+        logger.debug("⏰ Scheduled cleanup for %s in %ds", file_path.name, self.cleanup_delay)
+        if self._janitor_task is None:
+            self._janitor_task = asyncio.create_task(self._janitor())
+
+    async def _janitor(self) -> None:
+        """
+        Sleep until the earliest expiry, then delete every expired file in
+        one worker-thread batch. Sweeps are at least ``_SWEEP_INTERVAL``
+        apart so a burst of uploads is removed together. Files held by
+        :meth:`in_use` are re-queued instead. Exits once the queue is
+        empty; the next scheduled file starts it again.
+        """
+        last_sweep = float("-inf")
         try:
-            if file_path.exists():
-                file_path.unlink()
-                logger.info("🗑️ Removed: %s", file_path.name)
+            while self._expiry:
+                next_sweep = max(self._expiry[0][0], last_sweep + _SWEEP_INTERVAL)
+                delay = next_sweep - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now = last_sweep = time.monotonic()
+                due: List[Path] = []
+                held: List[Path] = []
+                while self._expiry and self._expiry[0][0] <= now:
+                    path = heapq.heappop(self._expiry)[1]
+                    if path in self._in_use:
+                        held.append(path)
+                    else:
+                        due.append(path)
+                for path in held:  # still being analysed – try again later
+                    heapq.heappush(self._expiry, (now + self.cleanup_delay, path))
+                for path in due:
+                    self._forget_base64(path)
+
+                removed = await asyncio.to_thread(_unlink_batch, due)
+                if removed:
+                    logger.info("🗑️ Removed %d expired image(s)", removed)
         except Exception as exc:  # noqa: BLE001
-            logger.error("❌ Error deleting %s: %s", file_path, exc)
+            logger.error("❌ Error in cleanup janitor: %s", exc)
+        finally:
+            self._janitor_task = None
 
     async def cleanup_old_files(self) -> None:
         """Remove all chart_* files in ``self.upload_folder``."""
         try:
-            removed = 0
-            for fp in self.upload_folder.glob("chart_*"):
-                if fp.is_file():
-                    await self._cleanup_file(fp)
-                    removed += 1
+            targets = await asyncio.to_thread(_list_charts, self.upload_folder)
+            # Striped over a few worker threads: parallel unlinks, one hop each
+            workers = min(_CLEANUP_WORKERS, len(targets))
+            counts = await asyncio.gather(
+                *(asyncio.to_thread(_unlink_batch, targets[i::workers]) for i in range(workers))
+            )
+            removed = sum(counts)
+            self._b64_cache.clear()
+            self._b64_cache_bytes = 0
             if removed:
                 logger.info("🗑️ Cleaned up %d old files", removed)
         except Exception as exc:  # noqa: BLE001
             logger.error("❌ Error in periodic cleanup: %s", exc)
 
 
-# ----------------------------------------------------------------------
-#  Extra synchronous helpers required by utils.ai_analyzer
-# ----------------------------------------------------------------------
-
-
-def img_to_base64(path: os.PathLike | str) -> str:
-    """
-    Return *just* the base-64 representation of an image file
-    (**without** the ``data:image/...;base64,`` prefix).
-    """
-    with open(path, "rb") as fh:
-        return base64.b64encode(fh.read()).decode("ascii")
-
-
-def validate_image(path: os.PathLike | str, min_px: int = 100) -> None:
-    """
-    Lightweight validation used by the analyser.
-
-    Raises
-    ------
-    ValueError
-        If the image is smaller than *min_px* in either dimension or
-        cannot be opened.
-    """
-    try:
-        with Image.open(path) as im:
-            w, h = im.size
-            if w < min_px or h < min_px:
-                raise ValueError(f"image too small: {w}×{h}px")
-    except Exception as exc:  # noqa: BLE001
-        # Re-raise as ValueError so callers only catch one type
-        raise ValueError(str(exc)) from exc
-
-
 # Singleton instance used across the bot
 image_handler = ImageHandler()
 
@@ -1,4 +1,4 @@
-import logging, os
+import atexit, logging, os, queue
 
 # Root level comes from env (default = INFO)
 logging.basicConfig(
@@ -7,14 +7,24 @@ logging.basicConfig(
 )
 
 # Keep 3 × 5 MB per run-time log file inside /app/logs
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 fh = RotatingFileHandler(
     "/app/logs/bot.log", maxBytes=5_000_000, backupCount=3, encoding="utf-8"
 )
 fh.setFormatter(logging.Formatter("%(asctime)s  %(levelname)-7s %(name)s - %(message)s"))
-logging.getLogger().addHandler(fh)
+
+# Console + file writes (and rotation) happen on a listener thread; callers
+# on the event loop only enqueue the record
+root = logging.getLogger()
+_handlers = [*root.handlers, fh]
+for h in root.handlers[:]:
+    root.removeHandler(h)
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+root.addHandler(QueueHandler(_log_queue))
+listener = QueueListener(_log_queue, *_handlers, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # flush what is still queued on exit
 
 # Silence very chatty libraries
 for noisy in ("telegram", "telegram.ext", "httpx"):
     logging.getLogger(noisy).setLevel(logging.WARNING)
-